@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from modules import config
+from modules.synthetic_league import generate_league
+from modules.cache import store, set_cache_mode
+from modules.league_info import league_cache_key
+from modules.player_stats import get_all_players, get_name_index, search_player_info, rankings_cache_key
+from modules.team_info import get_teams, get_free_agents, free_agents_cache_key, TeamValueEngine, IncrementalLineup
+from modules.simulation import simulate_trades_with_all, to_player_trade
+from modules.free_agents import find_free_agent_swaps
+from modules.selection import select_trades, trade_changes
+from modules.top_trades import TopTrades
+from modules.evaluator_cache import invalidate
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Times each phase of fantasytrader on a synthetic league")
+    parser.add_argument('--teams', type=int, default=12, help="Number of teams in the league (default: 12)")
+    parser.add_argument('--roster-size', type=int, default=16, help="Players on each roster (default: 16)")
+    parser.add_argument('--free-agents', type=int, default=200, help="Number of free agents (default: 200)")
+    parser.add_argument('--position-mix', type=json.loads, default=None,
+                        help='Relative number of players per position, as JSON (default: \'{"QB": 2, "RB": 5, "WR": 5, "TE": 2, "D/ST": 1, "K": 1}\')')
+    parser.add_argument('--trade-sizes', type=int, nargs='+', default=[2, 3, 4], help="Maximum Trade Size values to time (default: 2 3 4)")
+    parser.add_argument('--repeat', type=int, default=3, help="Times to run each phase, keeping the fastest (default: 3)")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes to simulate opponents' trades with (default: 1)")
+    parser.add_argument('--selection-node-limit', type=int, default=None, help="Sets of trades to try when selecting trades (default: from config.yml)")
+    parser.add_argument('--selection-time-limit', type=float, default=None, help="Seconds to search for the best set of trades at most (default: from config.yml)")
+    parser.add_argument('--seed', type=int, default=0, help="Seeds the synthetic league (default: 0)")
+    parser.add_argument('--output', default='benchmark.json', help="Where to write the results (default: benchmark.json)")
+    return parser.parse_args()
+
+def timed(function, repeat):
+    """Runs function repeat times, returning its last result and the fastest time in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def trade_rosters(engine, my_roster, trades):
+    """My roster after each trade, as a batch of rosters padded to the same size and their active masks"""
+    rosters = list()
+    for trade in trades:
+        to_remove, to_add, _ = trade_changes(engine, trade)
+        rosters.append([p for p in my_roster.tolist() if p not in to_remove] + to_add)
+    
+    width = max(map(len, rosters), default=0)
+    padded = np.zeros((len(rosters), width), dtype=np.intp)
+    active = np.zeros((len(rosters), width), dtype=bool)
+    for i, roster in enumerate(rosters):
+        padded[i, :len(roster)] = roster
+        active[i, :len(roster)] = True
+    return padded, active
+
+def load_league():
+    """Matches every player against the rankings, as fantasytrader does on startup"""
+    for function in (get_all_players, get_name_index, search_player_info, get_teams):
+        function.cache_clear()
+    invalidate()
+    return get_teams(), get_free_agents()
+
+def run(args, league):
+    # Serve the synthetic league through the cache, exactly as a real league is served with --offline
+    config.league_id = f"synthetic-{args.seed}"
+    config.team_name = league['teams'][0]['team_name']
+    config.check_free_agents = args.free_agents > 0
+    config.free_agent_pool_size = args.free_agents
+    store('rankings', rankings_cache_key(), league['rankings'])
+    store('league', league_cache_key('teams'), league['teams'])
+    store('league', free_agents_cache_key(), league['free_agents'])
+    store('league', league_cache_key('current_week'), league['current_week'])
+    set_cache_mode(use_offline=True)
+
+    node_limit = args.selection_node_limit if args.selection_node_limit is not None else config.trade_selection_node_limit
+    time_limit = args.selection_time_limit if args.selection_time_limit is not None else config.trade_selection_time_limit
+    (teams, free_agents), matching_time = timed(load_league, args.repeat)
+
+    engine, engine_time = timed(lambda: TeamValueEngine([player for team in teams for player in team['roster']] + free_agents), args.repeat)
+    my_team, other_teams = teams[0], teams[1:]
+    my_roster = engine.roster_indices(my_team['roster'])
+    other_rosters = [engine.roster_indices(other_team['roster']) for other_team in other_teams]
+
+    free_agent_trades, free_agent_time = timed(
+        lambda: find_free_agent_swaps(engine, my_roster, engine.roster_indices(free_agents)), args.repeat
+    )
+    free_agent_trades = [to_player_trade(engine, trade, 'Free Agents') for trade in free_agent_trades]
+
+    results = list()
+    for max_trade_size in args.trade_sizes:
+        print(f"Timing a Maximum Trade Size of {max_trade_size}")
+        simulated, simulation_time = timed(lambda: list(simulate_trades_with_all(
+            engine, my_roster, other_rosters, max_trade_size, config.maximum_team_size,
+            bench_weight=config.opponent_bench_weight, keep=config.trades_kept_per_team, workers=args.workers
+        )), args.repeat)
+
+        # Store the results once, then time a run that reuses them as no roster changed
+        simulate_reusing = lambda: list(simulate_trades_with_all(
+            engine, my_roster, other_rosters, max_trade_size, config.maximum_team_size,
+            bench_weight=config.opponent_bench_weight, keep=config.trades_kept_per_team, workers=args.workers, reuse=True
+        ))
+        simulate_reusing()
+        _, reused_time = timed(simulate_reusing, args.repeat)
+
+        best_trades = TopTrades(config.trades_kept)
+        search_stats = {'candidates': 0, 'pruned': 0, 'evaluated': 0, 'mutual': 0}
+        for other_team, (team_trades, team_stats) in zip(other_teams, simulated):
+            best_trades.extend(to_player_trade(engine, trade, other_team['team_name']) for trade in team_trades)
+            search_stats = {k: v + team_stats[k] for k, v in search_stats.items()}
+        best_trades.extend(free_agent_trades)
+        trades = best_trades.best()
+
+        selection, selection_time = timed(lambda: select_trades(engine, IncrementalLineup(engine, my_roster), trades, node_limit=node_limit, time_limit=time_limit), args.repeat)
+        
+        # Rest of season projections of my roster after each kept trade, in one batch
+        _, season_time = timed(lambda: engine.season_values(*trade_rosters(engine, my_roster, trades)), args.repeat)
+
+        results.append({
+            'maximum_trade_size': max_trade_size,
+            'phases': {
+                'matching': matching_time,
+                'engine': engine_time,
+                'simulation': simulation_time,
+                'simulation_reused': reused_time,
+                'free_agents': free_agent_time,
+                'selection': selection_time,
+                'season_projection': season_time,
+            },
+            'search': search_stats,
+            'trades': {'found': search_stats['mutual'] + len(free_agent_trades), 'kept': len(trades)},
+            'selection': {
+                'chosen': len(selection['chosen']),
+                'value': selection['value'],
+                'greedy_value': selection['greedy_value'],
+                'complete': selection['complete'],
+                'nodes': selection['nodes'],
+            },
+        })
+        print("\t" + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in results[-1]['phases'].items()))
+
+    return results
+
+def main():
+    args = parse_args()
+    league = generate_league(args.teams, args.roster_size, args.position_mix, args.free_agents, seed=args.seed)
+
+    # Keep the synthetic league out of the real cache
+    with tempfile.TemporaryDirectory() as cache_dir:
+        config.cache_path = os.path.join(cache_dir, 'benchmark.db')
+        results = run(args, league)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'league': {
+            'teams': args.teams,
+            'roster_size': args.roster_size,
+            'free_agents': args.free_agents,
+            'position_mix': args.position_mix,
+            'seed': args.seed,
+        },
+        'repeat': args.repeat,
+        'workers': args.workers,
+        'results': results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote results to {args.output}")
+
+if __name__ == "__main__":
+    main()
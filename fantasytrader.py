@@ -1,159 +1,326 @@
+import io
+import os
+import sys
+import json
+import argparse
+from functools import partial
+from contextlib import redirect_stdout, nullcontext
+
 from modules.player_stats import get_all_players
-from modules.team_info import get_teams, estimate_team_value, add_to_team, remove_from_team, get_free_agents, print_team, get_team_lineup
-from modules.trades_between import generate_trades_between
-from modules.evaluator import is_trade_mutual, is_beneficial, higher_is_better, worst_player
+from modules.team_info import get_teams, get_free_agents, print_team, plan_drops, TeamValueEngine, IncrementalLineup
+from modules.simulation import simulate_trades_with_all, to_player_trade
+from modules.free_agents import find_free_agent_swaps, plan_waivers
+from modules.selection import select_trades, trade_changes
+from modules.top_trades import TopTrades
+from modules.progress import ProgressLog, trade_summary, team_summary, finite_or_none
+from modules.cache import set_cache_mode
+from modules.evaluator_cache import describe_stats
 from modules import config
+from modules import profiling
+from modules.batch import get_leagues, use_league, run_leagues, league_settings
+from modules.server import LeagueState, serve
 
-print(f"Parsed info on {len(get_all_players())} players")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Finds the best trades and free agent pickups for your fantasy football team")
+    parser.add_argument('--workers', type=int, default=1, help="Number of processes to simulate opponents' trades with, or to run leagues with in batch mode (default: 1)")
+    parser.add_argument('--batch', action='store_true', help="Run every league under 'Leagues' in config.yml, sharing the player rankings")
+    parser.add_argument('--report-dir', metavar='DIR', help="In batch mode, also save each league's report to DIR/<league id>.txt (or .json)")
+    parser.add_argument('--format', choices=('text', 'json'), default='text',
+                        help="Print the report as text, or as one JSON object (one per line in batch mode) (default: text)")
+    parser.add_argument('--serve', type=int, metavar='PORT', help="Keep the league loaded and answer JSON requests on PORT instead of running once")
+    parser.add_argument('--host', default='127.0.0.1', help="The address to serve on (default: 127.0.0.1)")
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument('--offline', action='store_true', help="Only use cached rankings and league data, no matter how old")
+    cache_mode.add_argument('--refresh', action='store_true', help="Fetch rankings and league data even if they are cached")
+    parser.add_argument('--progress', metavar='PATH', help="Stream progress and the best trades so far to PATH as JSON Lines, or - for stdout")
+    parser.add_argument('--progress-trades', type=int, default=5, help="Number of best trades in each progress update (default: 5)")
+    parser.add_argument('--profile', action='store_true', help="Time each stage of the run and print a summary at the end")
+    parser.add_argument('--profile-output', metavar='PATH', help="Save cProfile stats of the run to PATH, for python -m pstats")
+    return parser.parse_args()
 
-print(f"Your team is {get_teams()[0]['team_name']}")
-print(print_team(get_teams()[0], scores=True, lineup=True))
+def print_progress(best_trades, found):
+    if not len(best_trades): return
+    best = best_trades.best()[0]
+    print(f"\tFound {found} mutually beneficial trades so far, the best is {best['my_delta']:+} with {best['other_team']}")
 
-print()
-print("Beginning trade simulation")
-mutually_beneficial_trades = list()
+def main():
+    args = parse_args()
+    config.validate(skip=league_settings if args.batch else ())
+    set_cache_mode(use_offline=args.offline, use_refresh=args.refresh)
+    
+    if args.batch:
+        run_batch(args)
+    elif args.serve is not None:
+        run_server(args)
+    else:
+        run(args)
 
-my_team = get_teams()[0]
-for other_team in get_teams()[1:]:
-    print(f"Simulating trades with {other_team['team_name']}")
-    for to_swap, to_receive in generate_trades_between(my_team['roster'], other_team['roster'], config.maximum_trade_size):
-        pre_swap_team1_value = estimate_team_value(my_team)
-        pre_swap_team2_value = estimate_team_value(other_team, bench_weight=config.opponent_bench_weight)
-        
-        # Perform swaps.
-        # Consider 4 'for's to handle name collisions
-        
-        # Skip all trades between the same position
-        # These are extremely unlikely to occur, since 
-        # one actor in the trade will always be screwed
-        
-        if all(s['position'] == r['position'] for s in to_swap for r in to_receive):
-            continue
+def league_path(path, league):
+    """Inserts the league id into a file path, so each league of a batch gets its own file"""
+    if path is None or path == '-': return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{league['league_id']}{ext}"
+
+def report_league(args, league):
+    """Runs one league of a batch, returning everything it printed"""
+    set_cache_mode(use_offline=args.offline, use_refresh=args.refresh)
+    use_league(league)
+    
+    # Leagues already run in parallel, so each simulates its opponents serially
+    args = argparse.Namespace(**{
+        **vars(args), 'workers': 1,
+        'progress': league_path(args.progress, league), 'profile_output': league_path(args.profile_output, league)
+    })
+    with redirect_stdout(io.StringIO()) as report:
+        run(args)
+    return report.getvalue()
+
+def run_batch(args):
+    leagues = get_leagues()
+    if not leagues:
+        raise SystemExit("Batch mode needs a list of Leagues in config.yml")
+    
+    # JSON reports are printed as JSON Lines, one league per line, with nothing in between
+    text = args.format == 'text'
+    print(f"Running {len(leagues)} leagues, sharing info on {len(get_all_players())} players", file=sys.stdout if text else sys.stderr)
+    if args.report_dir: os.makedirs(args.report_dir, exist_ok=True)
+    
+    reports = run_leagues(partial(report_league, args), leagues, workers=args.workers)
+    for league, report in zip(leagues, reports):
+        if text:
+            print()
+            print(f"===== League {league['league_id']}: {league['team_name']} =====")
+        print(report, end='')
         
-        my_team_postswap = my_team.copy()
-        ot_team_postswap = other_team.copy()
-        my_team_postswap['roster'] = my_team_postswap['roster'].copy()
-        ot_team_postswap['roster'] = ot_team_postswap['roster'].copy()
+        if args.report_dir:
+            with open(os.path.join(args.report_dir, f"{league['league_id']}.{'txt' if text else 'json'}"), 'w') as file:
+                file.write(report)
+
+def run_server(args):
+    """Keeps the league, the player index and the evaluator's scores in memory, and answers JSON requests about them"""
+    print(f"Parsed info on {len(get_all_players())} players")
+    state = LeagueState()
+    
+    # Reruns report quietly, reusing the loaded engine
+    def run_for(my_team=None):
+        with redirect_stdout(io.StringIO()):
+            return find_trades(argparse.Namespace(**{**vars(args), 'progress': None}), state.engine,
+                               state.teams_for(my_team or config.team_name), state.free_agents)
+    
+    def reload():
+        state.load()
+        return {'teams': [team['team_name'] for team in state.teams]}
+    
+    serve({
+        ('GET', '/teams'): lambda: [team_summary(team) for team in state.teams],
+        ('GET', '/team'): lambda name=None: team_summary(state.teams_for(name or config.team_name)[0]),
+        ('POST', '/evaluate'): state.evaluate_trade,
+        ('POST', '/run'): run_for,
+        ('POST', '/reload'): reload,
+    }, args.host, args.serve)
+
+def run(args):
+    """Finds and prints the best trades for the configured league, as text or as JSON"""
+    profiling.start(args.profile, args.profile_output)
+    
+    # Everything but the JSON report itself is kept off stdout
+    text = args.format == 'text'
+    with nullcontext() if text else redirect_stdout(io.StringIO()):
+        with profiling.timer('load'):
+            print(f"Parsed info on {len(get_all_players())} players")
+            get_teams()
         
-        for p in to_swap:
-            my_team_postswap = remove_from_team(my_team_postswap, p)
-            ot_team_postswap = add_to_team(ot_team_postswap, p)
+        free_agents = get_free_agents() if config.check_free_agents else list()
+        engine = TeamValueEngine([player for team in get_teams() for player in team['roster']] + free_agents)
+        report = find_trades(args, engine, get_teams(), free_agents)
         
-        for p in to_receive:
-            my_team_postswap = add_to_team(my_team_postswap, p)
-            ot_team_postswap = remove_from_team(ot_team_postswap, p)
-            
-        # Drop X players from our team until we reach the roster size limit
-        to_drop = list()
-        while len(my_team_postswap['roster']) > config.maximum_team_size:
-            # (we don't care about the other team since they will be reset)
-            team_lineup = get_team_lineup(my_team_postswap)
-            benched_players = team_lineup['Bench']
-            worst_benchie = worst_player(benched_players)
+        print()
+        print(describe_stats())
+    
+    if not text:
+        print(json.dumps(report))
+    
+    profiling.finish(args.profile_output)
+    output = sys.stdout if text else sys.stderr
+    if args.profile:
+        print(file=output)
+        print(profiling.summary(), file=output)
+        if args.workers > 1: print("Stages run in worker processes are only counted as part of 'simulation'", file=output)
+    if args.profile_output:
+        print(f"Saved cProfile stats to {args.profile_output}", file=output)
+
+def find_trades(args, engine, teams, free_agents):
+    """Finds and prints the best trades for the first of teams, returning them as a report of plain JSON serializable data
+    
+    Args:
+        args (argparse.Namespace): The command line arguments
+        engine (TeamValueEngine): An engine holding every player of teams and free_agents
+        teams (list[dict]): Every team, mine first
+        free_agents (list[Player]): The free agents to consider
+    """
+    my_team, other_teams = teams[0], teams[1:]
+    print(f"Your team is {my_team['team_name']}")
+    print(print_team(my_team, scores=True, lineup=True))
+
+    print()
+    print("Beginning trade simulation")
+    progress = ProgressLog(args.progress)
+
+    # Only the best trades are kept, per team and overall
+    # Because I can only trade each player once(ex, can't trade the same dude to two different teams)
+    # you can't take all the trades, and the weakest ones are never part of the best set
+    best_trades = TopTrades(config.trades_kept)
+    found = 0
+    interrupted = False
+    waiver_plan = list()
+
+    my_roster = engine.roster_indices(my_team['roster'])
+    other_rosters = [engine.roster_indices(other_team['roster']) for other_team in other_teams]
+    if args.workers > 1: print(f"Using {args.workers} worker processes")
+
+    # The search can be stopped with Ctrl+C, keeping every trade found so far
+    try:
+        with profiling.timer('simulation'):
+            results = simulate_trades_with_all(engine, my_roster, other_rosters, config.maximum_trade_size, config.maximum_team_size,
+                                               bench_weight=config.opponent_bench_weight, keep=config.trades_kept_per_team, workers=args.workers, reuse=True)
+            for other_team, (trades, search_stats) in zip(other_teams, results):
+                print(f"Simulating trades with {other_team['team_name']}")
+                best_trades.extend(to_player_trade(engine, trade, other_team['team_name']) for trade in trades)
+                found += search_stats['mutual']
+                print(f"\tEvaluated {search_stats['evaluated']} of {search_stats['candidates']} possible trades, pruned {search_stats['pruned']}")
+                if search_stats.get('reused'): print("\tNeither roster changed since the last run, reusing its trades")
+                print_progress(best_trades, found)
+                progress.log('team', team=other_team['team_name'], stats=search_stats, found=found,
+                             best=[trade_summary(trade) for trade in best_trades.best()[:args.progress_trades]])
+
+        # Now, consider all swaps for free agents
+        if config.check_free_agents:
+            print("Simulating trades with free agents")
+            free_agent_pool = engine.roster_indices(free_agents)
+            trades = find_free_agent_swaps(engine, my_roster, free_agent_pool)
+            best_trades.extend(to_player_trade(engine, trade, 'Free Agents') for trade in trades)
+            found += len(trades)
+            print_progress(best_trades, found)
+            progress.log('free_agents', found=found,
+                         best=[trade_summary(trade) for trade in best_trades.best()[:args.progress_trades]])
             
-            to_drop.append(worst_benchie)
-            my_team_postswap = remove_from_team(my_team_postswap, worst_benchie)
-        
-        post_swap_team1_value = estimate_team_value(my_team_postswap)
-        post_swap_team2_value = estimate_team_value(ot_team_postswap, bench_weight=config.opponent_bench_weight)
-        
-        if is_trade_mutual(pre_swap_team1_value, post_swap_team1_value, pre_swap_team2_value, post_swap_team2_value):
-            mutually_beneficial_trades.append({
-                'to_giveaway': to_swap,
-                'to_receive': to_receive,
-                'to_drop': to_drop,
-                'other_team': other_team['team_name'],
-                'my_delta': post_swap_team1_value - pre_swap_team1_value,
-                'their_delta': post_swap_team2_value - pre_swap_team2_value,
-            })
-
-# Now, consider all swaps for free agents
-if config.check_free_agents:
-    print("Simulating trades with free agents")
-    for (player_1,), (player_2,) in generate_trades_between(my_team['roster'], get_free_agents()):
-        pre_swap_team_value = estimate_team_value(my_team)
-        
-        my_team_postswap = remove_from_team(my_team, player_1)
-        my_team_postswap = add_to_team(my_team_postswap, player_2)
-        
-        post_swap_team_value = estimate_team_value(my_team_postswap)
-        
-        if is_beneficial(pre_swap_team_value, post_swap_team_value):
-            mutually_beneficial_trades.append({
-                    'to_giveaway': (player_1,),
-                    'to_receive': (player_2,),
-                    'to_drop': tuple(),
-                    'other_team': 'Free Agents',
-                    'my_delta': post_swap_team_value - pre_swap_team_value,
-                    'their_delta': 0,
-                })
-
-print(f"Found {len(mutually_beneficial_trades)} mutually beneficial trades")
-print("Filtering down to a set of optimal trades")
-
-# Because I can only trade each player once(ex, can't trade the same dude to two different teams)
-# you can't take all the trades
-# Use a greedy algorithm to solve
-
-players_to_trade = set()
-mutually_beneficial_trades = sorted(mutually_beneficial_trades, key=lambda x: x['my_delta'], reverse=higher_is_better)
-
-running_team = my_team.copy()
-i = 0
-for trade in mutually_beneficial_trades:
-    # Skip any trade that involves a player we've already traded
-    if any(player['name'] in players_to_trade for player in trade['to_giveaway']):
-        continue
-    if any(player['name'] in players_to_trade for player in trade['to_receive']):
-        continue
-    if any(player['name'] in players_to_trade for player in trade['to_drop']):
-        continue
-    
-    # Calculate the next possible team
-    next_running_team = running_team.copy()
-    for player in trade['to_giveaway']:
-        next_running_team = remove_from_team(next_running_team, player)
-    for player in trade['to_receive']:
-        next_running_team = add_to_team(next_running_team, player)
-    for player in trade['to_drop']:
-        next_running_team = remove_from_team(next_running_team, player)
-        
+            waiver_plan = [to_player_trade(engine, swap, 'Free Agents') for swap in plan_waivers(engine, my_roster, free_agent_pool, config.maximum_waiver_pickups)]
+            if waiver_plan:
+                print("\tBest waiver plan, using free agents alone:")
+            for swap in waiver_plan:
+                (player,), (free_agent,) = swap['to_giveaway'], swap['to_receive']
+                print(f"\t\tPick up {free_agent.name} ({free_agent.position}) for {player.name} ({player.position}): {swap['my_delta']:+}")
+            progress.log('waiver_plan', swaps=[trade_summary(swap) for swap in waiver_plan])
+    except KeyboardInterrupt:
+        interrupted = True
+        print()
+        print("Search stopped early, choosing from the trades found so far")
+        progress.log('interrupted', found=found)
+
+    print(f"Found {found} mutually beneficial trades, keeping the best {len(best_trades)}")
+    print("Filtering down to a set of optimal trades")
+
+    # Search for the set of trades that gives the best final lineup
+    mutually_beneficial_trades = best_trades.best()
+
+    running_lineup = IncrementalLineup(engine, my_roster)
+    selection = select_trades(engine, running_lineup, mutually_beneficial_trades,
+                              node_limit=config.trade_selection_node_limit, time_limit=config.trade_selection_time_limit)
+    season_points = engine.season_value(my_roster)
     
-    # Check if this team is acceptable
-    delta = estimate_team_value(next_running_team) - estimate_team_value(running_team)
-    if (higher_is_better and delta < 0) or (not higher_is_better and delta > 0):
-        # Never accept worse teams -> trade chain ends if team is invalid
-        break 
-    elif delta == 0:
-        # Ignore trades where we would just bench the new guy
-        continue 
+    # Dropping benched players never changes the lineup, so the drops are planned once, against the roster after every trade.
+    # Each is made as soon as a trade takes the roster over the limit and the player is on it, and the rest with the last trade.
+    final_lineup = IncrementalLineup(engine, my_roster)
+    for trade_index in selection['chosen']:
+        final_lineup.apply(*trade_changes(engine, mutually_beneficial_trades[trade_index])[:2])
+    pending_drops = plan_drops({'roster': final_lineup.roster()}, config.maximum_team_size)
+
+    chosen_trades, selected_trades = list(), list()
+    for i, trade_index in enumerate(selection['chosen'], start=1):
+        trade = mutually_beneficial_trades[trade_index]
+        to_remove, to_add, _ = trade_changes(engine, trade)
+        running_lineup.apply(remove=to_remove, add=to_add)
+
+        roster = running_lineup.roster()
+        excess = len(pending_drops) if i == len(selection['chosen']) else len(roster) - config.maximum_team_size
+        to_drop = [player for player in pending_drops if player in roster][:max(excess, 0)]
+        pending_drops = [player for player in pending_drops if player not in to_drop]
+        running_lineup.apply(remove=engine.roster_indices(to_drop).tolist())
+        trade = {**trade, 'to_drop': to_drop}
+        selected_trades.append(trade)
+        running_value = running_lineup.value()
+        next_season_points = engine.season_value(engine.roster_indices(running_lineup.roster()))
+    
+        # Print the trade
+        print(f"Trade Suggestion #{i} - {trade['other_team']}")
+        print("\t Trade away: ", end=" ")
+        for player in trade['to_giveaway']:
+            print(f"{player.name} ({player.position}) ", end=" ")
+        print("\n\t For: ", end=" ")
+        for player in trade['to_receive']:
+            print(f"{player.name} ({player.position}) ", end=" ")
+        if trade['to_drop']: print("\n\t Drop: ", end=" ")
+        for player in trade['to_drop']:
+            print(f"{player.name} ({player.position}) ", end=" ")
+        if trade['their_drop']: print("\n\t They drop: ", end=" ")
+        for player in trade['their_drop']:
+            print(f"{player.name} ({player.position}) ", end=" ")
+        print() 
+    
+        print(f"\tMy team value delta: {trade['my_delta']}")
+        print(f"\tTheir team value delta: {trade['their_delta']}")
+        if engine.weeks: print(f"\tRest of season projected points delta: {next_season_points - season_points:+.1f}")
+        chosen_trades.append({
+            **trade_summary(trade),
+            'running_value': finite_or_none(running_value),
+            'season_points_delta': next_season_points - season_points if engine.weeks else None,
+        })
+        season_points = next_season_points
+
+        print("Running Team Value: ", running_value)
+    
+    print()
+    print(f"Greedy trade chaining reaches a team value of {selection['greedy_value']}")
+    print(f"The selected trades reach {selection['value']} ({selection['value'] - selection['greedy_value']:+} over greedy)")
+    if selection['complete']:
+        print("The search was complete, these trades are optimal")
     else:
-        # This trade is good
-        running_team = next_running_team.copy()
-        players_to_trade.update(player['name'] for player in trade['to_giveaway'])
-        players_to_trade.update(player['name'] for player in trade['to_receive'])
-        players_to_trade.update(player['name'] for player in trade['to_drop'])
-    
-    # Print the trade
-    i += 1
-    print(f"Trade Suggestion #{i} - {trade['other_team']}")
-    print("\t Trade away: ", end=" ")
-    for player in trade['to_giveaway']:
-        print(f"{player['name']} ({player['position']}) ", end=" ")
-    print("\n\t For: ", end=" ")
-    for player in trade['to_receive']:
-        print(f"{player['name']} ({player['position']}) ", end=" ")
-    if trade['to_drop']: print("\n\t Drop: ", end=" ")
-    for player in trade['to_drop']:
-        print(f"{player['name']} ({player['position']}) ", end=" ")
-    print() 
-    
-    print(f"\tMy team value delta: {trade['my_delta']}")
-    print(f"\tTheir team value delta: {trade['their_delta']}")
-
-    print("Running Team Value: ", estimate_team_value(running_team))
-    
-
-print()
-
-print(print_team(running_team, scores=True, lineup=True))
\ No newline at end of file
+        print(f"The search stopped after {selection['nodes']} sets of trades, no set of trades can reach more than {selection['upper_bound']}")
+
+    if engine.weeks:
+        print(f"Over weeks {engine.weeks[0]}-{engine.weeks[-1]}, your team is projected to score {engine.season_value(my_roster):.1f} points, "
+              f"and {season_points:.1f} after these trades")
+
+    print()
+
+    running_team = {**my_team, 'roster': running_lineup.roster()}
+    print(print_team(running_team, scores=True, lineup=True))
+    
+    progress.log('selection', complete=selection['complete'], value=selection['value'], greedy_value=selection['greedy_value'],
+                 trades=[trade_summary(trade) for trade in selected_trades])
+    progress.close()
+    
+    return {
+        'league_id': config.league_id,
+        'team': team_summary(my_team),
+        'found': found,
+        'kept': len(mutually_beneficial_trades),
+        'interrupted': interrupted,
+        'waiver_plan': [trade_summary(swap) for swap in waiver_plan],
+        'trades': chosen_trades,
+        'selection': {
+            'value': finite_or_none(selection['value']),
+            'greedy_value': finite_or_none(selection['greedy_value']),
+            'upper_bound': finite_or_none(selection['upper_bound']),
+            'complete': selection['complete'],
+        },
+        'season': {
+            'weeks': [engine.weeks[0], engine.weeks[-1]],
+            'points': engine.season_value(my_roster),
+            'points_after_trades': season_points,
+        } if engine.weeks else None,
+        'team_after_trades': team_summary(running_team),
+    }
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from modules import config
+from modules.config import normalize_str
+from modules.league_info import get_league, get_current_week
+from modules.player_stats import get_name_index
+from modules.team_info import get_teams
+from modules.evaluator_cache import invalidate
+
+# Settings that each league of a batch can set for itself
+league_settings = ('league_id', 'team_name', 'swid', 'espn_s2')
+
+def get_leagues():
+    """The leagues under 'Leagues' in config.yml, each falling back to the top-level settings it does not set"""
+    leagues = list()
+    for entry in getattr(config, 'leagues', None) or list():
+        entry = {normalize_str(k): v for k, v in entry.items()}
+        for name, value in entry.items():
+            if str(value).startswith('your_'):
+                raise SystemExit(f'Please change {name} of league {entry.get("league_id")} in config.yml')
+        leagues.append({name: entry[name] if name in entry else getattr(config, name) for name in league_settings})
+    return leagues
+
+def use_league(league):
+    """Points the league settings, and everything cached about the league, at another league
+    The rankings and name index are the same for every league, so they are kept.
+    """
+    for name, value in league.items():
+        setattr(config, name, value)
+    forget_league()
+
+def forget_league():
+    """Clears everything cached in memory about the league, so it is loaded again"""
+    get_league.cache_clear()
+    get_current_week.cache_clear()
+    get_teams.cache_clear()
+    invalidate()
+
+def run_leagues(run, leagues, workers=1):
+    """Calls run(league) for every league, across a pool of worker processes, yielding the results in order
+    run must call use_league itself, as it may run in another process.
+    """
+    # Loaded once up front, so every worker shares it (forked workers inherit it,
+    # others read the cached rankings instead of scraping them again)
+    get_name_index()
+
+    if workers <= 1:
+        yield from map(run, leagues)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(run, leagues)
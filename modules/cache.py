@@ -0,0 +1,81 @@
+import os
+import json
+import time
+import sqlite3
+from functools import cache
+
+from modules import config
+
+offline = False # Never fetch, use cached data no matter how old
+refresh = False # Always fetch, ignoring cached data
+
+def set_cache_mode(use_offline=False, use_refresh=False):
+    """Switches the cache to offline mode or forces every source to refresh"""
+    global offline, refresh
+    if use_offline and use_refresh:
+        raise ValueError("The cache cannot be both offline and refreshing")
+    offline, refresh = use_offline, use_refresh
+
+def get_connection():
+    # A connection must not be used across fork(), so forked workers open their own
+    return open_connection(os.getpid())
+
+@cache
+def open_connection(pid):
+    path = config.cache_path
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    connection = sqlite3.connect(path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS entries (
+            source TEXT NOT NULL,
+            key TEXT NOT NULL,
+            created REAL NOT NULL,
+            value TEXT NOT NULL,
+            PRIMARY KEY (source, key)
+        )
+    """)
+    return connection
+
+def cached(source, key, loader):
+    """Returns parsed data from the on-disk cache, loading and storing it when stale
+
+    Args:
+        source (str): The kind of data, with a TTL (in minutes) under 'Cache TTL' in config.yml
+        key (str): Identifies the data within its source
+        loader (Callable): Fetches the data. It must return something JSON serializable.
+
+    Returns:
+        The cached or freshly loaded data
+    """
+    data = lookup(source, key)
+    if data is not None:
+        return data
+
+    if offline:
+        raise RuntimeError(f"No cached {source} data for {key}, cannot fetch it while offline")
+
+    data = loader()
+    store(source, key, data)
+    return data
+
+def lookup(source, key):
+    """Returns parsed data from the on-disk cache, or None if it is missing or stale"""
+    if refresh: return None
+
+    row = get_connection().execute("SELECT created, value FROM entries WHERE source = ? AND key = ?", (source, key)).fetchone()
+    if row is None: return None
+
+    created, value = row
+    if offline or time.time() - created < 60 * config.cache_ttl[source]:
+        return json.loads(value)
+    return None
+
+def store(source, key, data):
+    """Saves data to the on-disk cache, replacing anything cached under the same key"""
+    with get_connection() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (source, key, created, value) VALUES (?, ?, ?, ?)",
+            (source, key, time.time(), json.dumps(data))
+        )
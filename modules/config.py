@@ -1,18 +1,48 @@
-import yaml
-from anyascii import anyascii
+from functools import cache
+
+# Settings are read from config.yml the first time one is used, as config.snake_case_name.
+# Assigning config.name = value overrides a setting for the rest of the run.
+
+config_path = 'config.yml'
 
 def normalize_str(_str) -> str:
+    from anyascii import anyascii
     _str = anyascii(_str)
     _str = _str.lower()
     _str = _str.replace(' ', '_')
     _str = _str.replace('-', '_')
     return _str
 
-with open('config.yml', 'r') as file:
-    raw_cfg = yaml.safe_load(file)
-    for k, v in raw_cfg.items():
-        if str(v).startswith('your_'):
-            print(f'Please change {k} in config.yml')
-            exit(1)
-        
-        globals()[normalize_str(k)] = v
+@cache
+def get_config():
+    """Reads config.yml, keyed by the normalized setting names"""
+    import yaml
+    with open(config_path, 'r') as file:
+        raw_cfg = yaml.safe_load(file)
+    return {normalize_str(k): (k, v) for k, v in raw_cfg.items()}
+
+def get_setting(name):
+    """Returns a setting, exiting with a message if it was never filled in"""
+    if name not in get_config():
+        raise AttributeError(f"config.yml has no setting {name!r}")
+
+    k, v = get_config()[name]
+    if str(v).startswith('your_'):
+        raise SystemExit(f'Please change {k} in config.yml')
+    return v
+
+def validate(skip=()):
+    """Checks every setting up front, as there is no point in running with an unfinished config
+
+    Args:
+        skip (Iterable[str], optional): Settings not to check, as they are set some other way. Defaults to none.
+    """
+    for name in get_config():
+        if name not in skip and name not in globals():
+            get_setting(name)
+
+def __getattr__(name):
+    # Only called for settings that have not been overridden
+    if name.startswith('__'):
+        raise AttributeError(name)
+    return get_setting(name)
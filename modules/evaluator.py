@@ -1,11 +1,20 @@
+import numpy as np
+from functools import cache
+
 from modules import config
-from modules.league_info import league
+from modules.league_info import get_current_week
+from modules.profiling import timed
 
 smoid = lambda x: 1/(1+2.71828**x)
 
+@cache
+def get_week_rating():
+    """Computed once per run, as the week does not change"""
+    week = get_current_week()
+    return smoid((week-5)/2) # Decrease weight of 'explore' as week approaches 10
+
 def player_evaluator(player):
-    week = league.current_week
-    week_rating = smoid((week-5)/2) # Decrease weight of 'explore' as week approaches 10
+    week_rating = get_week_rating()
     
     player_value = 50 * week_rating * (1 - player['percentile'] ** 0.5) # Ranges from 0-50 strictly
     
@@ -17,18 +26,24 @@ def player_evaluator(player):
     player_value += week_rating * (0.15 * player['proj_season_points']) ** 1.5 # Ranges from 0-250, with overflow
     return round(player_value)
 
+@timed('evaluate')
+def evaluate_players(players):
+    """Scores every player once, returning a value vector aligned with the given list"""
+    return np.array([player.score for player in players])
+
 higher_is_better = True # If false: will minimize. If true: will maximize
 
 def is_trade_mutual(pre_swap_my_value, post_swap_my_value, pre_swap_other_value, post_swap_other_value):
     neg_edge_percentage = 1 - config.maximum_trade_edge
     edge_percentage = 1 + config.maximum_trade_edge
     
+    # Comparisons are combined with & so that arrays of values can be checked at once
     if not higher_is_better:
-        return post_swap_my_value < pre_swap_my_value and \
-               neg_edge_percentage*post_swap_other_value <= pre_swap_other_value
+        return (post_swap_my_value < pre_swap_my_value) & \
+               (neg_edge_percentage*post_swap_other_value <= pre_swap_other_value)
     else:
-        return post_swap_my_value > pre_swap_my_value and \
-               edge_percentage*post_swap_other_value >= pre_swap_other_value
+        return (post_swap_my_value > pre_swap_my_value) & \
+               (edge_percentage*post_swap_other_value >= pre_swap_other_value)
 
 def is_beneficial(pre_swap_value, post_swap_value):
     if not higher_is_better:
@@ -41,15 +56,15 @@ def worst_player(roster):
         return None
     
     if higher_is_better:
-        return min(roster, key=player_evaluator)
+        return min(roster, key=lambda player: player.score)
     else:
-        return max(roster, key=player_evaluator)
+        return max(roster, key=lambda player: player.score)
     
 def best_player(roster):
     if len(roster) == 0:
         return None
     
     if higher_is_better:
-        return max(roster, key=player_evaluator)
+        return max(roster, key=lambda player: player.score)
     else:
-        return min(roster, key=player_evaluator)
\ No newline at end of file
+        return min(roster, key=lambda player: player.score)
\ No newline at end of file
@@ -0,0 +1,49 @@
+import hashlib
+import inspect
+
+from modules import evaluator
+from modules.profiling import count
+
+stats = {'hits': 0, 'misses': 0}
+scores = dict() # (player id, evaluator version, player inputs) -> score
+
+loaded_evaluator = None
+loaded_version = None
+
+def invalidate():
+    """Forgets every cached score and the hits and misses counted so far, along with the week rating they were computed with"""
+    global loaded_evaluator, loaded_version
+    scores.clear()
+    stats.update(hits=0, misses=0)
+    evaluator.get_week_rating.cache_clear()
+    loaded_evaluator, loaded_version = None, None
+
+def evaluator_version():
+    """Identifies the loaded evaluator by its source code and week rating
+    Reloading the evaluator module gives a new player_evaluator, which clears the cache.
+    """
+    global loaded_evaluator, loaded_version
+    if loaded_evaluator is not evaluator.player_evaluator:
+        scores.clear()
+        source = inspect.getsource(evaluator)
+        loaded_evaluator = evaluator.player_evaluator
+        loaded_version = hashlib.sha1(f"{source}\n{evaluator.get_week_rating()}".encode()).hexdigest()[:16]
+    return loaded_version
+
+def cached_score(player):
+    """Scores a Player with player_evaluator, reusing the score while the player's inputs and the evaluator are unchanged"""
+    info = player.to_dict()
+    key = (player.id, evaluator_version(), tuple(info.values()))
+    if key in scores:
+        stats['hits'] += 1
+        return scores[key]
+    
+    stats['misses'] += 1
+    count('players evaluated')
+    scores[key] = evaluator.player_evaluator(info)
+    return scores[key]
+
+def describe_stats():
+    total = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / total if total else 0
+    return f"Evaluator cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0%} hit rate)"
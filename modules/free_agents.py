@@ -0,0 +1,89 @@
+import numpy as np
+from bisect import bisect_left
+
+from modules.team_info import IncrementalLineup
+from modules.evaluator import is_beneficial, higher_is_better
+from modules.profiling import timed, count
+
+@timed('free agents')
+def find_free_agent_swaps(engine, my_roster, free_agents):
+    """Finds every swap of one of my players for one free agent that improves my team
+
+    Adding a player never lowers a lineup's value, so a free agent can only help
+    if adding them alone would. Within a position that is true of every free agent
+    above some score, found by binary search, so most free agents are never evaluated.
+    Giving away a player who neither starts nor plays flex leaves the lineup as if the
+    free agent were just added, so only starters and the flex are evaluated one by one.
+
+    Args:
+        engine (TeamValueEngine): The engine holding every player
+        my_roster (np.ndarray): Pool indices of my roster
+        free_agents (np.ndarray): Pool indices of the free agents
+
+    Returns:
+        list[dict]: The beneficial swaps in the same form as simulate_trades_with,
+                    in roster order and then free agent order
+    """
+    lineup = IncrementalLineup(engine, my_roster)
+    pre_swap_team_value = lineup.value()
+    free_agents = free_agents.tolist()
+
+    if higher_is_better:
+        helpful = helpful_free_agents(engine, lineup, pre_swap_team_value, free_agents)
+    else:
+        helpful = list(range(len(free_agents)))
+
+    counted = engine.counted_players(my_roster)
+    swaps = list()
+    for j in helpful:
+        free_agent = free_agents[j]
+        added_value = lineup.value_after(add=[free_agent])
+        for i, player in enumerate(my_roster.tolist()):
+            post_swap_team_value = lineup.value_after(remove=[player], add=[free_agent]) if counted[i] else added_value
+            if is_beneficial(pre_swap_team_value, post_swap_team_value):
+                swaps.append((i, j, {
+                    'to_giveaway': (player,),
+                    'to_receive': (free_agent,),
+                    'to_drop': list(),
+                    'their_drop': list(),
+                    'my_delta': post_swap_team_value - pre_swap_team_value,
+                    'their_delta': 0,
+                }))
+
+    count('free agents evaluated', len(helpful))
+    return [swap for _, _, swap in sorted(swaps, key=lambda x: x[:2])]
+
+def helpful_free_agents(engine, lineup, team_value, free_agents):
+    """The positions in free_agents of those who would improve the lineup if added, by binary search per position"""
+    by_position = dict()
+    for j, free_agent in enumerate(free_agents):
+        by_position.setdefault(int(engine.position_codes[free_agent]), list()).append(j)
+
+    helpful = list()
+    for code, candidates in by_position.items():
+        # Worst first, so the helpful free agents are a suffix
+        candidates = sorted(candidates, key=lambda j: engine.values[free_agents[j]])
+        helps = lambda j: is_beneficial(team_value, lineup.value_after(add=[free_agents[j]]))
+        first = bisect_left(range(len(candidates)), True, key=lambda k: helps(candidates[k]))
+        helpful += candidates[first:]
+    return sorted(helpful)
+
+def plan_waivers(engine, my_roster, free_agents, max_pickups):
+    """Plans up to max_pickups waiver moves, each the best swap for a free agent given the moves before it
+
+    Returns:
+        list[dict]: The swaps, in order, each with its my_delta at the time it is made
+    """
+    roster, pool, plan = my_roster, free_agents, list()
+    for _ in range(max_pickups):
+        swaps = find_free_agent_swaps(engine, roster, pool)
+        if not swaps: break
+
+        best = max(swaps, key=lambda swap: swap['my_delta']) if higher_is_better else min(swaps, key=lambda swap: swap['my_delta'])
+        plan.append(best)
+
+        # Kept players stay in roster order, the new player is appended
+        (player,), (free_agent,) = best['to_giveaway'], best['to_receive']
+        roster = np.append(roster[roster != player], free_agent)
+        pool = pool[pool != free_agent]
+    return plan
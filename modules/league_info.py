@@ -1,5 +1,18 @@
 from modules import config
-from espn_api.football import League
+from modules.cache import cached
 from datetime import datetime
+from functools import cache
 
-league = League(int(config.league_id), datetime.now().year, config.espn_s2 or None, config.swid or None, debug=False)
+@cache
+def get_league():
+    """Connects to the configured ESPN league. Only called when league data is not cached"""
+    from espn_api.football import League
+    return League(int(config.league_id), datetime.now().year, config.espn_s2 or None, config.swid or None, debug=False)
+
+def league_cache_key(name):
+    """The cache key of some league data, unique to the configured league and season"""
+    return f"{config.league_id}/{datetime.now().year}/{name}"
+
+@cache
+def get_current_week():
+    return cached('league', league_cache_key('current_week'), lambda: get_league().current_week)
@@ -0,0 +1,51 @@
+from itertools import count
+
+from modules.evaluator_cache import cached_score
+
+# Players without an ESPN id get one far from ESPN's range
+anonymous_ids = count(10 ** 12)
+
+class Player:
+    """A player on a roster or in free agency
+
+    Players are compared by identity and carry a stable integer id (their ESPN id when known).
+    They hold the same fields as the dicts built by merge_player_info, and to_dict()
+    converts back to that form for user-written evaluators.
+    Weekly projections are left out of to_dict(), so evaluators are given the same fields as ever.
+    Each CBS expert's rank (with Parse Expert Rankings) is only added when there are any.
+    """
+
+    __slots__ = ('id', 'name', 'rank', 'percentile', 'pos', 'position', 'proj_points', 'proj_season_points',
+                 'weekly_proj_points', 'expert_ranks', 'eligible_slots')
+    dict_fields = ('name', 'rank', 'percentile', 'pos', 'position', 'proj_points', 'proj_season_points')
+
+    def __init__(self, id, name, rank, percentile, pos, position, proj_points, proj_season_points, eligible_slots=(), weekly_proj_points=(), expert_ranks=()):
+        self.id = id if id is not None else next(anonymous_ids)
+        self.name = name
+        self.rank = rank
+        self.percentile = percentile
+        self.pos = pos
+        self.position = position
+        self.proj_points = proj_points
+        self.proj_season_points = proj_season_points
+        self.eligible_slots = tuple(eligible_slots) # Lineup slots this player can start in
+        self.weekly_proj_points = tuple(map(tuple, weekly_proj_points)) # (week, projected points) of each remaining week
+        self.expert_ranks = tuple(expert_ranks) # Rank by each expert, None where unranked
+
+    @classmethod
+    def from_dict(cls, info:dict, eligible_slots=()):
+        return cls(info.get('player_id'), *(info[field] for field in cls.dict_fields), eligible_slots=eligible_slots,
+                   weekly_proj_points=info.get('weekly_proj_points', ()), expert_ranks=info.get('expert_ranks', ()))
+
+    def to_dict(self):
+        info = {field: getattr(self, field) for field in self.dict_fields}
+        if self.expert_ranks: info['expert_ranks'] = self.expert_ranks
+        return info
+
+    @property
+    def score(self):
+        """The player's evaluator score, computed once per evaluator version"""
+        return cached_score(self)
+
+    def __repr__(self):
+        return f"Player({self.id}, {self.name!r}, {self.position})"
@@ -1,38 +1,149 @@
 from functools import cache
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
 
 from modules import config
-from modules.proxied_request import proxied_get
-from lxml import html
-from Levenshtein import ratio
+from modules.cache import cached
+from modules.profiling import timed, count
+from rapidfuzz.process import cdist
+from rapidfuzz.distance import Indel
+import numpy as np
+
+positions = ['QB', 'RB', 'WR', 'TE', 'K', 'DST']
 
 # Ideally, we could scrape the player stats from https://www.fantasypros.com/nfl/rankings/ros-overall.php
 @cache
 def get_all_players():
     """Returns a list of all players, sorted by position and rank"""
-    players = list()
+    return cached('rankings', rankings_cache_key(), scrape_all_players)
+
+def rankings_cache_key():
+    # Rankings with each expert's ranks are cached apart from those without
+    return 'cbs/ppr/experts' if config.parse_expert_rankings else 'cbs/ppr'
+
+@timed('scrape')
+def scrape_all_players():
+    """Scrapes every position's rankings from CBS"""
+    # Only needed when the rankings are not cached, so this is imported here
+    from modules.proxied_request import proxied_get_many
     
-    for pos in ['QB', 'RB', 'WR', 'TE', 'K', 'DST']:
-        raw_html = proxied_get(f'https://www.cbssports.com/fantasy/football/rankings/ppr/{pos}/')
-        doc = html.fromstring(raw_html.content)
-        
-        # TODO: consider parsing individual expert rankings instead of consensus rankings
-        consensus_rankings = doc.xpath('//*[normalize-space(@class)="experts-column triple"]')[0]
-        total_ranks = len(consensus_rankings.xpath('.//div[@class="player"]'))
-        for rank, player in enumerate(consensus_rankings.xpath('.//div[@class="player"]')):
-            if not player.xpath('./a'): continue
-            player_name = player.xpath('./a')[0].text_content()
-            
-            percentile = rank / total_ranks
-            
-            players.append({
-                'name': player_name.strip(),
-                'rank': rank,
-                'percentile': percentile,
-                'pos': pos,
-            })
+    # Fetch every position's page at once
+    pages = proxied_get_many([f'https://www.cbssports.com/fantasy/football/rankings/ppr/{pos}/' for pos in positions])
+    
+    # lxml releases the GIL while it parses, so the pages are parsed in threads
+    with ThreadPoolExecutor(max_workers=len(positions)) as executor:
+        rankings = executor.map(parse_rankings, [page.content for page in pages], positions, repeat(config.parse_expert_rankings))
+        return [player for players in rankings for player in players]
+
+@cache
+def ranking_xpaths():
+    """The xpaths of a rankings page, compiled once rather than on every call"""
+    from lxml import etree
+    find_columns = etree.XPath('//*[contains(@class, "experts-column")]')
+    find_players = etree.XPath('.//div[@class="player"]')
+    find_link = etree.XPath('./a[1]')
+    return find_columns, find_players, find_link
+
+def column_names(column):
+    """The name of each player in an experts column, by rank, with None for rows without a linked player
+    Only the ends of each name are stripped, so names with unusual spacing match as they always have.
+    """
+    _, find_players, find_link = ranking_xpaths()
+    names = list()
+    for player in find_players(column):
+        link = find_link(player)
+        names.append(link[0].text_content().strip() if link else None)
+    return names
+
+def parse_rankings(content, pos, expert_ranks=False):
+    """Parses one position's rankings page
+
+    Args:
+        content (bytes): The page's html
+        pos (str): The position the page ranks
+        expert_ranks (bool, optional): Also give each player an 'expert_ranks' list of their rank in each
+                                       individual expert's column, None where they are unranked. Defaults to False.
+
+    Returns:
+        list[dict]: The players of the consensus rankings, in the form of scrape_all_players
+    """
+    from lxml import html
+    find_columns = ranking_xpaths()[0]
+    
+    # Every experts column is found in one pass over the page, the consensus column is the triple width one
+    columns = [column for column in find_columns(html.document_fromstring(content)) if 'experts-column' in column.get('class').split()]
+    consensus = [column for column in columns if column.get('class').split() == ['experts-column', 'triple']]
+    if not consensus:
+        raise ValueError(f"The {pos} rankings page has no consensus rankings")
+    consensus = consensus[0]
+    experts = [column for column in columns if column is not consensus]
+    
+    names = column_names(consensus)
+    players = [
+        {'name': name, 'rank': rank, 'percentile': rank / len(names), 'pos': pos}
+        for rank, name in enumerate(names) if name is not None
+    ]
+    
+    if expert_ranks:
+        # Each expert's column is read once, and its ranks placed through a dict of consensus names
+        by_name = dict()
+        for player in players:
+            player['expert_ranks'] = [None] * len(experts)
+            by_name.setdefault(player['name'], player)
+        for i, column in enumerate(experts):
+            for rank, name in enumerate(column_names(column)):
+                if name in by_name:
+                    by_name[name]['expert_ranks'][i] = rank
     
     return players
 
+class PlayerNameIndex:
+    """A prebuilt index of player names, per position
+    
+    Exact (case-insensitive) names are found with a dict lookup.
+    Everything else is scored against the names of the position in one batched call,
+    which gives the same ratios as Levenshtein.ratio.
+    """
+    
+    def __init__(self, players):
+        self.players = {None: list(players)}
+        for player in players:
+            self.players.setdefault(player['pos'], list()).append(player)
+        
+        self.names = {pos: [p['name'].lower() for p in players] for pos, players in self.players.items()}
+        self.exact = dict()
+        for pos, players in self.players.items():
+            for name, player in zip(self.names[pos], players):
+                self.exact.setdefault((pos, name), list()).append(player)
+    
+    def search_many(self, player_names, pos=None):
+        """Searches for several players of the same position at once, as search_player_info does
+
+        Returns:
+            list[list[dict]]: The best matches for each name, in the order of the index
+        """
+        if not self.players.get(pos): return [list() for _ in player_names]
+        
+        queries = [name.lower() for name in player_names]
+        results = [self.exact.get((pos, query)) for query in queries]
+        
+        # Only names without an exact match need fuzzy matching
+        unmatched = [i for i, result in enumerate(results) if result is None]
+        count('fuzzy name matches', len(unmatched))
+        if unmatched:
+            scores = cdist([queries[i] for i in unmatched], self.names[pos], scorer=Indel.normalized_similarity, dtype=np.float64)
+            for i, row in zip(unmatched, scores):
+                results[i] = [self.players[pos][j] for j in np.flatnonzero(row == row.max())]
+        
+        return [list(result) for result in results]
+    
+    def search(self, player_name, pos=None):
+        return self.search_many([player_name], pos)[0]
+
+@cache
+def get_name_index():
+    return PlayerNameIndex(get_all_players())
+
 @cache
 def search_player_info(player_name, pos=None):
     """Search for a player by name, optionally filtered by position
@@ -46,16 +157,14 @@ def search_player_info(player_name, pos=None):
                    Some players may have the same name, so this may return multiple players.
     """
     
-    players = get_all_players()
-    if pos is not None: players = [p for p in players if p['pos'] == pos]
-    if not players: return list()
-    
-    players = [(p, ratio(p['name'].lower(), player_name.lower())) for p in players]
-    players = sorted(players, key=lambda x: x[1], reverse=True)
+    return get_name_index().search(player_name, pos)
+
+def pick_player_info(results, player_name, pos=None):
+    """Breaks ties between search results by percentile, falling back to a dummy player"""
     
-    max_val = players[0][1]
-    players = [p[0] for p in players if p[1] == max_val]
-    return players
+    # Assume we want the best player, by percentile
+    dummy_player = {'name': player_name, 'pos': pos or 'FLEX', 'rank': 100, 'percentile': 1}
+    return max(results, key=lambda x: x['percentile']) if results else dummy_player
 
 def get_player_info(player_name, pos=None):
     """Get a single player with the given name and position.
@@ -69,11 +178,31 @@ def get_player_info(player_name, pos=None):
     Returns:
         dict: That player's info
     """
-    results = search_player_info(player_name, pos)
+    return pick_player_info(search_player_info(player_name, pos), player_name, pos)
+
+@timed('match')
+def get_players_info(names_and_positions, index=None):
+    """Batched get_player_info for a whole roster of (player_name, pos) pairs, matching each position at once
+
+    Args:
+        names_and_positions (list[tuple]): The name and position of each player
+        index (PlayerNameIndex, optional): The index to search. Defaults to the index of get_all_players.
+
+    Returns:
+        list[dict]: Each player's info, in the same order
+    """
+    index = index or get_name_index()
     
-    # Assume we want the best player, by percentile
-    dummy_player = {'name': player_name, 'pos': pos or 'FLEX', 'rank': 100, 'percentile': 1}
-    return max(results, key=lambda x: x['percentile']) if results else dummy_player
+    by_position = dict()
+    for i, (_, pos) in enumerate(names_and_positions):
+        by_position.setdefault(pos, list()).append(i)
+    
+    infos = [None] * len(names_and_positions)
+    for pos, indices in by_position.items():
+        names = [names_and_positions[i][0] for i in indices]
+        for i, name, results in zip(indices, names, index.search_many(names, pos)):
+            infos[i] = pick_player_info(results, name, pos)
+    return infos
 
 def get_players(pos):
     """Returns a list of players with the given position"""
@@ -0,0 +1,74 @@
+import time
+import cProfile
+from collections import defaultdict
+from functools import wraps
+
+# Timers and counters for each stage of a run, only recorded with --profile
+enabled = False
+timers = defaultdict(lambda: [0, 0.0]) # stage -> [calls, seconds]
+counters = defaultdict(int)
+profiler = None
+
+class timer:
+    """Times a block of code under a stage name: with timer('match'): ..."""
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if enabled:
+            entry = timers[self.name]
+            entry[0] += 1
+            entry[1] += time.perf_counter() - self.start
+
+def timed(name):
+    """Decorates a function to time every call under a stage name"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, n=1):
+    if enabled:
+        counters[name] += n
+
+def start(profile=False, profile_output=None):
+    """Turns on the stage timers, and cProfile if its output is to be saved"""
+    global enabled, profiler
+    enabled = profile
+    timers.clear()
+    counters.clear()
+    if profile_output:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+def finish(profile_output=None):
+    """Saves the cProfile stats, readable with python -m pstats"""
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_output)
+        profiler = None
+
+def summary():
+    """A table of the time spent in each stage, and every counter"""
+    lines = [f"{'Stage':<24}{'Calls':>10}{'Seconds':>12}{'Per call (ms)':>16}"]
+    for name, (calls, seconds) in sorted(timers.items(), key=lambda x: x[1][1], reverse=True):
+        lines.append(f"{name:<24}{calls:>10}{seconds:>12.3f}{1000 * seconds / calls:>16.3f}")
+
+    if counters:
+        lines.append("")
+        lines.append(f"{'Counter':<24}{'Count':>10}")
+        for name, value in sorted(counters.items()):
+            lines.append(f"{name:<24}{value:>10}")
+    return '\n'.join(lines)
@@ -0,0 +1,59 @@
+import sys
+import json
+import math
+import time
+
+from modules.team_info import get_team_lineup, estimate_team_value
+
+def player_summary(player):
+    return {'id': player.id, 'name': player.name, 'position': player.position}
+
+def finite_or_none(value):
+    # Invalid lineups are worth infinity, which JSON cannot hold
+    return value if math.isfinite(value) else None
+
+def team_summary(team):
+    """A team's lineup, as print_team shows it, as plain JSON serializable data"""
+    return {
+        'team_name': team['team_name'],
+        'lineup': {
+            slot: [{**player_summary(player), 'score': finite_or_none(player.score)} for player in players]
+            for slot, players in get_team_lineup(team).items()
+        },
+        'value': finite_or_none(estimate_team_value(team)),
+    }
+
+def trade_summary(trade):
+    """A trade of Players as plain JSON serializable data"""
+    return {
+        'other_team': trade['other_team'],
+        'to_giveaway': [player_summary(player) for player in trade['to_giveaway']],
+        'to_receive': [player_summary(player) for player in trade['to_receive']],
+        'to_drop': [player_summary(player) for player in trade['to_drop']],
+        'their_drop': [player_summary(player) for player in trade['their_drop']],
+        'my_delta': finite_or_none(trade['my_delta']),
+        'their_delta': finite_or_none(trade['their_delta']),
+    }
+
+class ProgressLog:
+    """Streams progress events as JSON Lines, one object per line, flushed as they happen
+    Does nothing without a path, so it can always be called.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            self.file = None
+        elif path == '-':
+            # The real stdout, as the report may be captured (--format json, batch mode) while progress streams
+            self.file = sys.__stdout__
+        else:
+            self.file = open(path, 'w')
+
+    def log(self, event, **fields):
+        if self.file is None: return
+        self.file.write(json.dumps({'event': event, 'time': time.time(), **fields}) + '\n')
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None and self.file is not sys.__stdout__:
+            self.file.close()
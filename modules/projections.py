@@ -0,0 +1,19 @@
+import numpy as np
+
+def projection_matrix(players):
+    """Builds a (players, weeks) matrix of each player's projected points for every remaining week
+
+    Weeks are those any player has a projection for, in order. Weeks a player
+    has no projection for (ex: their bye) are projected at 0.
+
+    Returns:
+        tuple: The week numbers and the float32 matrix
+    """
+    weeks = sorted({week for player in players for week, _ in player.weekly_proj_points})
+    columns = {week: j for j, week in enumerate(weeks)}
+
+    matrix = np.zeros((len(players), len(weeks)), dtype=np.float32)
+    for i, player in enumerate(players):
+        for week, points in player.weekly_proj_points:
+            matrix[i, columns[week]] = points
+    return weeks, matrix
@@ -1,6 +1,29 @@
+import time
 import requests
 import random
+from functools import cache
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from modules import config
+from modules.profiling import count
+
+proxy_list_url = 'https://api.proxyscrape.com/v2/?request=displayproxies&protocol=http&timeout=10000&country=all&anonymity=all'
+max_connections_per_host = 8
+
+@cache
+def get_session():
+    """A pooled session shared by every request, so connections to each host are reused"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max_connections_per_host, pool_maxsize=max_connections_per_host)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+@cache
+def get_proxies():
+    """Fetches the list of proxies once per run"""
+    proxy_req = get_session().get(proxy_list_url)
+    return [str(x).strip() for x in proxy_req.text.split('\n') if x.strip()]
 
 def proxied_get(*args, **kwargs):
     return proxied_request('GET', *args, **kwargs)
@@ -8,23 +31,33 @@ def proxied_get(*args, **kwargs):
 def proxied_post(*args, **kwargs):
     return proxied_request('POST', *args, **kwargs)
 
-def proxied_request(method, *args, max_retries=3, **kwargs):
+def proxied_get_many(urls, max_workers=max_connections_per_host, **kwargs):
+    """GETs several urls concurrently, returning their responses in the same order (None for failures)"""
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+        return list(executor.map(lambda url: proxied_get(url, **kwargs), urls))
+
+def proxied_request(method, *args, max_retries=3, backoff=0.5, **kwargs):
     # Pick a proxy to use
-    proxy_req = requests.get('https://api.proxyscrape.com/v2/?request=displayproxies&protocol=http&timeout=10000&country=all&anonymity=all')
-    proxies = [str(x).strip() for x in proxy_req.text.split('\n') if x.strip()]
-    proxies = random.choices(proxies, k=max(max_retries, len(proxies)))
-    
+    proxies = get_proxies() if config.use_proxies else list()
+    if proxies:
+        proxies = random.choices(proxies, k=max(max_retries, len(proxies)))
+
     for i in range(max_retries):
-        # Try to apply proxy 
-        if config.use_proxies and i < len(proxies):
+        # Wait longer after each failure
+        if i > 0:
+            time.sleep(backoff * 2 ** (i - 1))
+
+        # Try to apply proxy
+        if i < len(proxies):
             kwargs['proxies'] = {'http': proxies[i], 'https': proxies[i]}
-        
+
         if config.user_agent:
             kwargs['headers'] = {**kwargs.get('headers',{}), **{'User-Agent': config.user_agent}}
-        
+
         # Try to make the request
+        count('requests')
         try:
-            resp = requests.request(method, *args, **kwargs)
+            resp = get_session().request(method, *args, **kwargs)
         except Exception as e:
             print(f'Error during request: {e}')
             continue
@@ -32,9 +65,8 @@ def proxied_request(method, *args, max_retries=3, **kwargs):
         # If the request was successful, return the response
         if resp.status_code == 200:
             return resp
-        
+
         # Otherwise, try again
         print(f'Error during request, response: {resp.status_code}')
     # All retries failed
     return None
-
@@ -0,0 +1,297 @@
+import time
+import numpy as np
+
+from modules.evaluator import higher_is_better
+from modules.profiling import timed
+
+def trade_changes(engine, trade):
+    """The pool indices a trade removes from and adds to my roster, and the ids of every player it involves
+    My drops are left out: dropping benched players never changes my lineup's value, and which players
+    to drop depends on the other trades made, so they are planned with plan_drops once the trades are chosen.
+    The players the other team drops are involved, since no other trade can then receive them.
+    """
+    to_remove = engine.roster_indices(trade['to_giveaway']).tolist()
+    to_add = engine.roster_indices(trade['to_receive']).tolist()
+    players = {player.id for player in (*trade['to_giveaway'], *trade['to_receive'], *trade['their_drop'])}
+    return to_remove, to_add, players
+
+def greedy_trades(engine, lineup, trades):
+    """Chains trades greedily, best my_delta first, as fantasytrader always has
+
+    Trades involving an already traded player are skipped, as are trades that would only bench the new player.
+    The chain ends at the first trade that would make the team worse.
+
+    Returns:
+        tuple: The positions of the chosen trades and the final team value
+    """
+    changes = [trade_changes(engine, trade) for trade in trades]
+    used, removed, added, chosen = set(), list(), list(), list()
+    running_value = lineup.value_after()
+
+    for i, (to_remove, to_add, players) in enumerate(changes):
+        # Skip any trade that involves a player we've already traded
+        if players & used:
+            continue
+
+        next_running_value = lineup.value_after(remove=removed + to_remove, add=added + to_add)
+        delta = next_running_value - running_value
+        if (higher_is_better and delta < 0) or (not higher_is_better and delta > 0):
+            # Never accept worse teams -> trade chain ends if team is invalid
+            break
+        elif delta == 0:
+            # Ignore trades where we would just bench the new guy
+            continue
+
+        chosen.append(i)
+        used |= players
+        removed += to_remove
+        added += to_add
+        running_value = next_running_value
+
+    return chosen, running_value
+
+def upper_gains(engine, lineup, changes, passes=4):
+    """Bounds what each trade can add to the value of any set of trades it is part of
+
+    A lineup is the best assignment of players to slots. By LP duality, pricing each slot at any price
+    of at least 0 bounds a lineup's value by the price of every slot, plus what each player is worth
+    above the cheapest slot they can fill. A player's worth does not depend on the rest of the roster,
+    so no set of trades can beat the bound of my roster plus, for each of its trades, the worth of its
+    incoming players less the worth of its outgoing ones.
+    Trades giving away the same player conflict, so at most one gain of each such group counts.
+    The prices are fit by coordinate descent, to make the bound of the best trade of every group as low as possible.
+
+    Returns:
+        tuple: The bound of my current roster, the gain of each trade and the group of each trade,
+               or None if lower values are better
+    """
+    if not higher_is_better:
+        return None
+
+    roster = list(lineup.entries)
+    pool = list(dict.fromkeys(roster + [p for to_remove, to_add, _ in changes for p in (*to_remove, *to_add)]))
+    column = {p: j for j, p in enumerate(pool)}
+    pool = np.array(pool, dtype=np.intp)
+    values = engine.values[pool].astype(float)
+    codes = engine.position_codes[pool]
+    starts = engine.slots[codes] > 0
+    flex = engine.flex_eligible[pool]
+    counts = np.append(engine.slots, engine.flex_slots) # The slots of each position, then flex
+    flex_code = len(counts) - 1
+
+    on_roster = np.zeros(len(pool))
+    on_roster[[column[p] for p in roster]] = 1
+    exchange = np.zeros((len(changes), len(pool))) # 1 for each incoming player, -1 for each outgoing one
+    for i, (to_remove, to_add, _) in enumerate(changes):
+        exchange[i, [column[p] for p in to_add]] = 1
+        exchange[i, [column[p] for p in to_remove]] = -1
+
+    # Each trade is grouped by the first player it gives away
+    groups = [min(column[p] for p in to_remove) if to_remove else len(pool) + i for i, (to_remove, _, _) in enumerate(changes)]
+    by_group = np.argsort(groups, kind='stable')
+    group_starts = np.flatnonzero(np.diff(np.array(groups)[by_group], prepend=-1))
+
+    def worths(prices):
+        cheapest = np.minimum(np.where(starts, prices[:, codes], np.inf), np.where(flex, prices[:, [flex_code]], np.inf))
+        return np.maximum(values - cheapest, 0)
+
+    def bounds(prices):
+        worth = worths(prices)
+        gains = np.maximum(worth @ exchange[by_group].T, 0)
+        best_gains = np.maximum.reduceat(gains, group_starts, axis=1).sum(axis=1) if len(changes) else 0
+        return prices @ counts + worth @ on_roster + best_gains
+
+    # Flex can take the players of several positions, so their prices also move together
+    flex_codes = np.append(np.unique(codes[flex & starts]), flex_code)
+    blocks = [[code] for code in np.flatnonzero(counts)] + [flex_codes]
+
+    # Start from my roster's replacement levels: each position at its best benched player, flex at the best player left out of it
+    prices = np.zeros((1, len(counts)))
+    left_out = np.zeros(len(pool), dtype=bool)
+    for code in np.flatnonzero(counts[:-1]):
+        mine = np.flatnonzero((on_roster > 0) & (codes == code))
+        mine = mine[np.argsort(-values[mine], kind='stable')]
+        left_out[mine[counts[code]:]] = True
+        prices[0, code] = values[mine[counts[code]]] if len(mine) > counts[code] else 0
+    bench = np.flatnonzero(left_out & flex)
+    bench = bench[np.argsort(-values[bench], kind='stable')]
+    prices[0, flex_codes] = values[bench[counts[flex_code]]] if len(bench) > counts[flex_code] else 0
+    bound = bounds(prices)[0]
+
+    for _ in range(passes):
+        improved = False
+        for block in blocks:
+            eligible = np.isin(codes, block) & starts | (flex if flex_code in block else False)
+            levels = np.append(0, np.unique(values[eligible]))
+            candidates = np.repeat(prices, len(levels), axis=0)
+            candidates[:, block] = levels[:, None]
+            candidate_bounds = bounds(candidates)
+            best = np.argmin(candidate_bounds)
+            if candidate_bounds[best] < bound:
+                prices, bound, improved = candidates[[best]], candidate_bounds[best], True
+        if not improved:
+            break
+
+    worth = worths(prices)[0]
+    return (prices @ counts + worth @ on_roster)[0], (exchange @ worth).tolist(), groups
+
+@timed('selection')
+def select_trades(engine, lineup, trades, node_limit=5000, time_limit=60):
+    """Finds the set of non-conflicting trades that gives the best final lineup, by branch and bound
+
+    Trades conflict when they share a player. The search starts from the greedy chain, expands the trades
+    with the best upper_gains first, and is bounded both by the current value plus the best gain of each group
+    of remaining compatible trades, and by the value of having every player those trades could bring in.
+    It ends as soon as a set reaches either bound for all the trades. Trades the final lineup does not need are then left out.
+    The search stops after node_limit sets, so the same trades always give the same result,
+    and time_limit only caps very slow runs. Either way, the best set found so far is returned.
+
+    Args:
+        engine (TeamValueEngine): The engine holding every player
+        lineup (IncrementalLineup): My current lineup, which is not modified
+        trades (list[dict]): Mutually beneficial trades, in order of preference
+        node_limit (int, optional): Sets of trades to evaluate. Defaults to 5000.
+        time_limit (int, optional): Seconds to search for at most. Defaults to 60.
+
+    Returns:
+        dict: The positions of the 'chosen' trades, in the order to make them, and their final 'value', the 'greedy' chain and its 'greedy_value',
+              the best possible value found, 'upper_bound', whether the search was 'complete', and the 'nodes' it evaluated
+    """
+    changes = [trade_changes(engine, trade) for trade in trades]
+    sign = 1 if higher_is_better else -1
+    deadline = time.monotonic() + time_limit
+
+    greedy, greedy_value = greedy_trades(engine, lineup, trades)
+    best = {'chosen': greedy, 'value': greedy_value}
+    complete = True
+    nodes = 0
+
+    bounds = upper_gains(engine, lineup, changes)
+    base_bound, gains, groups = bounds if bounds else (None, None, None)
+    order = sorted(range(len(changes)), key=lambda i: -gains[i]) if gains else list(range(len(changes)))
+
+    # Trades are in order of gain, so those with a positive gain, the only ones that can raise a bound, come first
+    positive = sum(gain > 0 for gain in gains) if gains else 0
+
+    # How many chosen trades share a player with each trade, in order. Each player lists the trades they are part of,
+    # so choosing or undoing a trade only touches those.
+    blocked = np.zeros(len(order), dtype=np.int32)
+    conflicts = dict()
+    for k, i in enumerate(order):
+        for player in changes[i][2]:
+            conflicts.setdefault(player, list()).append(k)
+    conflicts = {player: np.array(ks) for player, ks in conflicts.items()}
+
+    def block(i, count):
+        for player in changes[i][2]:
+            blocked[conflicts[player]] += count
+
+    order_gains = np.array([gains[i] for i in order[:positive]]) if gains else np.zeros(0)
+    order_groups = np.array([groups[i] for i in order[:positive]], dtype=np.int64) if gains else np.zeros(0, dtype=np.int64)
+
+    def best_gains(ks):
+        """The best gains of the trades at each position of ks on, and 0 past its end. ks are positions in order with positive gains
+
+        At most one trade of each group can be made, and the first one of a group from a position on has its best gain.
+        So each trade counts from just after the one before it in its group, up to itself.
+        """
+        ks_groups = order_groups[ks]
+        by_group = np.lexsort((ks, ks_groups))
+        same = ks_groups[by_group][1:] == ks_groups[by_group][:-1]
+        previous = np.full(len(ks), -1)
+        previous[by_group[1:][same]] = by_group[:-1][same]
+
+        steps = np.zeros(len(ks) + 1)
+        np.add.at(steps, previous + 1, order_gains[ks])
+        np.add.at(steps, np.arange(1, len(ks) + 1), -order_gains[ks])
+        return np.cumsum(steps)
+
+    # The players each trade brings in, in order. Only the top few of each position can start or play flex,
+    # so those are enough to value a roster with every player the remaining trades could bring in.
+    receives = np.full((len(order), max((len(to_add) for _, to_add, _ in changes), default=0)), -1, dtype=np.int64)
+    for k, i in enumerate(order):
+        receives[k, :len(changes[i][1])] = changes[i][1]
+    kept = np.asarray(engine.slots, dtype=np.int64) + engine.flex_slots
+
+    def incoming(ks):
+        players = np.unique(receives[ks])
+        players = players[players >= 0]
+        players = players[np.lexsort((-engine.values[players], engine.position_codes[players]))]
+        codes = engine.position_codes[players]
+        rank = np.arange(len(players)) - np.searchsorted(codes, codes)
+        return players[rank < kept[codes]].tolist()
+
+    # The best any set of trades could reach: once a set reaches it, the search is over
+    ceiling = best['value']
+    if higher_is_better:
+        ceiling = lineup.value_after(add=incoming(np.arange(len(order))))
+        if gains:
+            ceiling = min(ceiling, base_bound + best_gains(np.arange(positive))[0])
+
+    def finished():
+        return not complete or (higher_is_better and best['value'] >= ceiling)
+
+    def search(start, chosen, removed, added, gain):
+        nonlocal complete, nodes
+        if finished():
+            return
+        if nodes >= node_limit or time.monotonic() > deadline:
+            complete = False
+            return
+        nodes += 1
+
+        value = lineup.value_after(remove=removed, add=added)
+        if sign * value > sign * best['value']:
+            best['chosen'], best['value'] = chosen, value
+
+        # Nothing below this node can beat having every player the compatible trades after it could bring in
+        remaining = start + np.flatnonzero(blocked[start:] == 0)
+        if higher_is_better and lineup.value_after(remove=removed, add=added + incoming(remaining)) <= best['value']:
+            return
+
+        totals = best_gains(remaining[remaining < positive]) if gains else list()
+        for j, k in enumerate(remaining.tolist()):
+            i = order[k]
+            to_remove, to_add, _ = changes[i]
+
+            # Nothing below this trade can beat its gain plus the best gains after it, and both only shrink further on
+            if gains and base_bound + gain + gains[i] + (totals[j + 1] if j + 1 < len(totals) else 0) <= best['value']:
+                break
+            block(i, 1)
+            search(k + 1, chosen + [i], removed + to_remove, added + to_add, gain + (gains[i] if gains else 0))
+            block(i, -1)
+            if finished():
+                break
+
+    search(0, list(), list(), list(), 0)
+
+    # Leave out any chosen trade the final lineup does not need, least preferred first
+    for i in sorted(best['chosen'], reverse=True):
+        rest = [j for j in best['chosen'] if j != i]
+        value = lineup.value_after(remove=[p for j in rest for p in changes[j][0]], add=[p for j in rest for p in changes[j][1]])
+        if sign * value >= sign * best['value']:
+            best['chosen'], best['value'] = rest, value
+
+    # Make the chosen trades one at a time, each the one that leaves the best lineup, so no trade leaves the team worse or invalid
+    # in between unless every other one would too. Ties go to the trade earlier in order of preference.
+    chosen, removed, added = list(), list(), list()
+    left = sorted(best['chosen'])
+    while left:
+        values = [lineup.value_after(remove=removed + changes[i][0], add=added + changes[i][1]) for i in left]
+        i = left[max(range(len(left)), key=lambda j: (sign * values[j], -j))]
+        chosen.append(i)
+        left.remove(i)
+        removed += changes[i][0]
+        added += changes[i][1]
+
+    upper_bound = best['value'] if complete or not higher_is_better else ceiling
+
+    return {
+        'chosen': chosen,
+        'value': best['value'],
+        'greedy': greedy,
+        'greedy_value': greedy_value,
+        'upper_bound': upper_bound,
+        'complete': complete,
+        'nodes': nodes,
+    }
@@ -0,0 +1,134 @@
+import json
+import numpy as np
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from modules import config
+from modules.team_info import get_teams, get_free_agents, claim_team, TeamValueEngine
+from modules.simulation import to_player_trade
+from modules.evaluator import is_trade_mutual
+from modules.progress import trade_summary
+from modules.batch import forget_league
+
+class LeagueState:
+    """The league, its players and their engine, loaded once and kept in memory between requests"""
+
+    def __init__(self):
+        self.load()
+
+    def load(self):
+        forget_league()
+        self.teams = get_teams()
+        self.free_agents = get_free_agents() if config.check_free_agents else list()
+        self.engine = TeamValueEngine([player for team in self.teams for player in team['roster']] + self.free_agents)
+
+    def teams_for(self, team_name):
+        """The teams, ordered as get_teams orders them for whoever's team is closest to team_name"""
+        return claim_team(self.teams, str(team_name))
+
+    def evaluate_trade(self, team, give, receive, my_team=None):
+        """Evaluates a single trade with another team, as the trade search would
+
+        Args:
+            team (str): The other team's name
+            give (list): Names or ids of the players on my team to give away
+            receive (list): Names or ids of the players on their team to receive
+            my_team (str, optional): My team's name. Defaults to config.team_name.
+
+        Returns:
+            dict: The trade, as trade_summary gives it, and whether it is 'mutual'
+        """
+        my_team = self.teams_for(my_team or config.team_name)[0]
+        other_team = self.teams_for(team)[0]
+        if other_team['team_id'] == my_team['team_id']:
+            raise ValueError("A trade needs two different teams")
+        if not give or not receive:
+            raise ValueError("A trade needs players on both sides")
+
+        engine = self.engine
+        my_roster, other_roster = engine.roster_indices(my_team['roster']), engine.roster_indices(other_team['roster'])
+        to_swap = np.array([roster_positions(my_team, give)], dtype=np.intp)
+        to_receive = np.array([roster_positions(other_team, receive)], dtype=np.intp)
+
+        bench_weight = config.opponent_bench_weight
+        pre_swap_my_value = engine.team_value(my_roster)
+        pre_swap_other_value = engine.team_value(other_roster, bench_weight=bench_weight)
+        my_values, other_values, to_drop, their_drop = engine.evaluate_trades(
+            my_roster, other_roster, to_swap, to_receive, config.maximum_team_size, bench_weight=bench_weight
+        )
+
+        trade = to_player_trade(engine, {
+            'to_giveaway': tuple(my_roster[to_swap[0]].tolist()),
+            'to_receive': tuple(other_roster[to_receive[0]].tolist()),
+            'to_drop': [j for j in to_drop[0].tolist() if j >= 0],
+            'their_drop': [j for j in their_drop[0].tolist() if j >= 0],
+            'my_delta': my_values[0].item() - pre_swap_my_value,
+            'their_delta': other_values[0].item() - pre_swap_other_value,
+        }, other_team['team_name'])
+        mutual = is_trade_mutual(pre_swap_my_value, my_values[0].item(), pre_swap_other_value, other_values[0].item())
+        return {**trade_summary(trade), 'mutual': bool(mutual)}
+
+def roster_positions(team, players):
+    """The positions in a team's roster of players, given by id or by name, each at most once"""
+    positions = [roster_position(team, player) for player in players]
+    if len(set(positions)) < len(positions):
+        raise ValueError(f"A player of {team['team_name']} is listed more than once")
+    return positions
+
+def roster_position(team, player):
+    """The position in a team's roster of a player, given by id or by name"""
+    for i, candidate in enumerate(team['roster']):
+        if str(candidate.id) == str(player) or candidate.name.lower() == str(player).lower():
+            return i
+    raise ValueError(f"{team['team_name']} has no player {player!r}")
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Calls the route of each request with its query or JSON body as keyword arguments, replying with JSON"""
+
+    def do_GET(self):
+        self.respond(dict(parse_qsl(urlsplit(self.path).query)))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or '{}')
+        except json.JSONDecodeError as error:
+            return self.reply(400, {'error': f"Invalid JSON: {error}"})
+        self.respond(params)
+
+    def respond(self, params):
+        route = self.server.routes.get((self.command, urlsplit(self.path).path))
+        if route is None:
+            return self.reply(404, {'error': f"No route {self.command} {urlsplit(self.path).path}"})
+
+        try:
+            self.reply(200, route(**params))
+        except (TypeError, ValueError) as error:
+            self.reply(400, {'error': str(error)})
+        except Exception as error:
+            self.reply(500, {'error': repr(error)})
+            raise
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve(routes, host='127.0.0.1', port=8000):
+    """Answers requests until interrupted, one at a time, so routes can share state without locks
+
+    Args:
+        routes (dict): Functions to call, by (method, path)
+    """
+    server = HTTPServer((host, port), RequestHandler)
+    server.routes = routes
+    print(f"Serving on http://{host}:{server.server_port}, press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,159 @@
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+
+from modules import config
+from modules.trades_between import generate_pruned_trade_batches
+from modules.evaluator import is_trade_mutual, higher_is_better
+from modules.evaluator_cache import evaluator_version
+from modules.team_info import positions_on_team
+from modules.top_trades import TopTrades
+from modules.cache import lookup, store
+
+# Bump whenever a change to the search changes its results, so stored results are not reused
+simulation_version = 2
+
+def generate_mutual_trades(engine, my_roster, other_roster, max_trade_size, max_team_size, bench_weight=0, stats=None):
+    """Yields every mutually beneficial trade between my roster and another, in search order
+    Players are pool indices of the engine, so the inputs and results stay small and picklable.
+
+    Args:
+        engine (TeamValueEngine): The engine holding every player
+        my_roster (np.ndarray): Pool indices of my roster
+        other_roster (np.ndarray): Pool indices of the other roster
+        max_trade_size (int): As config.maximum_trade_size
+        max_team_size (int): As config.maximum_team_size
+        bench_weight (int, optional): The weight of the other team's bench. Defaults to 0.
+        stats (dict, optional): Filled with the search stats of generate_pruned_trade_batches
+
+    Yields:
+        dict: A trade, with pool indices to give away, receive and drop, and those the other team drops
+    """
+    pre_swap_team1_value = engine.team_value(my_roster)
+    pre_swap_team2_value = engine.team_value(other_roster, bench_weight=bench_weight)
+
+    for to_swap, to_receive in generate_pruned_trade_batches(engine, my_roster, other_roster, max_trade_size,
+                                                             bench_weight=bench_weight, stats=stats):
+        # Perform swaps, dropping players from both teams until they reach the roster size limit
+        post_swap_team1_values, post_swap_team2_values, to_drop, their_drop = engine.evaluate_trades(
+            my_roster, other_roster, to_swap, to_receive, max_team_size, bench_weight=bench_weight
+        )
+
+        mutual = is_trade_mutual(pre_swap_team1_value, post_swap_team1_values, pre_swap_team2_value, post_swap_team2_values)
+        for i in np.flatnonzero(mutual):
+            yield {
+                'to_giveaway': tuple(my_roster[to_swap[i]].tolist()),
+                'to_receive': tuple(other_roster[to_receive[i]].tolist()),
+                'to_drop': [j for j in to_drop[i].tolist() if j >= 0],
+                'their_drop': [j for j in their_drop[i].tolist() if j >= 0],
+                'my_delta': post_swap_team1_values[i].item() - pre_swap_team1_value,
+                'their_delta': post_swap_team2_values[i].item() - pre_swap_team2_value,
+            }
+
+def simulate_trades_with(engine, my_roster, other_roster, max_trade_size, max_team_size, bench_weight=0, keep=None):
+    """Runs generate_mutual_trades against one roster, keeping only the best trades
+
+    Args:
+        keep (int, optional): The number of trades to keep, best my_delta first. Defaults to all of them.
+
+    Returns:
+        tuple: The kept trades, best first, and the search stats, with the number of 'mutual' trades found
+    """
+    search_stats = dict()
+    trades = generate_mutual_trades(engine, my_roster, other_roster, max_trade_size, max_team_size, bench_weight, search_stats)
+    top_trades = TopTrades(keep if keep is not None else float('inf'))
+    top_trades.extend(trades)
+    search_stats['mutual'] = top_trades.seen
+    return top_trades.best(), search_stats
+
+def simulate_trades_with_all(engine, my_roster, other_rosters, max_trade_size, max_team_size, bench_weight=0, keep=None, workers=1, reuse=False):
+    """Runs simulate_trades_with against every other roster, optionally across a pool of worker processes
+    Results are yielded in the order of other_rosters regardless of the number of workers, as each roster finishes.
+    
+    With reuse, results are stored in the on-disk cache under a fingerprint of everything they depend on,
+    and only the rosters whose fingerprint changed since an earlier run are simulated again.
+    Reused results have 'reused' set in their search stats.
+    """
+    if not reuse:
+        yield from run_simulations(engine, my_roster, other_rosters, max_trade_size, max_team_size, bench_weight, keep, workers)
+        return
+    
+    keys = [simulation_key(engine, my_roster, other_roster, max_trade_size, max_team_size, bench_weight, keep) for other_roster in other_rosters]
+    stored = [lookup('simulations', key) for key in keys]
+    changed = [other_roster for other_roster, result in zip(other_rosters, stored) if result is None]
+    
+    simulated = run_simulations(engine, my_roster, changed, max_trade_size, max_team_size, bench_weight, keep, workers)
+    for key, result in zip(keys, stored):
+        if result is not None:
+            trades, search_stats = result
+            yield [trade_from_ids(engine, trade) for trade in trades], {**search_stats, 'reused': True}
+        else:
+            trades, search_stats = next(simulated)
+            store('simulations', key, [[trade_to_ids(engine, trade) for trade in trades], search_stats])
+            yield trades, search_stats
+
+def run_simulations(engine, my_roster, other_rosters, max_trade_size, max_team_size, bench_weight, keep, workers):
+    if workers <= 1:
+        for other_roster in other_rosters:
+            yield simulate_trades_with(engine, my_roster, other_roster, max_trade_size, max_team_size, bench_weight, keep)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(
+            simulate_trades_with, repeat(engine), repeat(my_roster), other_rosters,
+            repeat(max_trade_size), repeat(max_team_size), repeat(bench_weight), repeat(keep)
+        )
+
+def simulation_key(engine, my_roster, other_roster, max_trade_size, max_team_size, bench_weight, keep):
+    """Fingerprints everything the simulation of a pair of rosters depends on
+    Rosters are in order, with each player's score and lineup slots, as the order breaks ties.
+    """
+    def roster_fingerprint(roster):
+        return [
+            [engine.players[j].id, engine.values[j].item(), engine.positions[engine.position_codes[j]], bool(engine.flex_eligible[j])]
+            for j in roster.tolist()
+        ]
+    
+    inputs = {
+        'version': simulation_version,
+        'evaluator': evaluator_version(),
+        'higher_is_better': higher_is_better,
+        'positions_on_team': positions_on_team,
+        'settings': [max_trade_size, max_team_size, bench_weight, config.maximum_trade_edge, keep],
+        'my_roster': roster_fingerprint(my_roster),
+        'other_roster': roster_fingerprint(other_roster),
+    }
+    return hashlib.sha1(json.dumps(inputs).encode()).hexdigest()
+
+def trade_to_ids(engine, trade):
+    """A trade of pool indices with player ids instead, as pool indices change between runs"""
+    return {
+        **trade,
+        'to_giveaway': [engine.players[j].id for j in trade['to_giveaway']],
+        'to_receive': [engine.players[j].id for j in trade['to_receive']],
+        'to_drop': [engine.players[j].id for j in trade['to_drop']],
+        'their_drop': [engine.players[j].id for j in trade['their_drop']],
+    }
+
+def trade_from_ids(engine, trade):
+    return {
+        **trade,
+        'to_giveaway': tuple(engine.index[i] for i in trade['to_giveaway']),
+        'to_receive': tuple(engine.index[i] for i in trade['to_receive']),
+        'to_drop': [engine.index[i] for i in trade['to_drop']],
+        'their_drop': [engine.index[i] for i in trade['their_drop']],
+    }
+
+def to_player_trade(engine, trade, other_team_name):
+    """Turns a trade of pool indices back into the trade of Players that fantasytrader prints"""
+    return {
+        'to_giveaway': tuple(engine.players[j] for j in trade['to_giveaway']),
+        'to_receive': tuple(engine.players[j] for j in trade['to_receive']),
+        'to_drop': [engine.players[j] for j in trade['to_drop']],
+        'their_drop': [engine.players[j] for j in trade['their_drop']],
+        'other_team': other_team_name,
+        'my_delta': trade['my_delta'],
+        'their_delta': trade['their_delta'],
+    }
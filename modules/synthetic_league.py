@@ -0,0 +1,112 @@
+import random
+import string
+
+# ESPN position -> CBS rankings position
+cbs_positions = {'QB': 'QB', 'RB': 'RB', 'WR': 'WR', 'TE': 'TE', 'D/ST': 'DST', 'K': 'K'}
+
+# Players of each position on a 16 player roster
+default_position_mix = {'QB': 2, 'RB': 5, 'WR': 5, 'TE': 2, 'D/ST': 1, 'K': 1}
+
+# Weeks of the fantasy regular season
+last_week = 17
+
+# Typical weekly projections of a starter, per position
+projected_points = {'QB': 18, 'RB': 12, 'WR': 11, 'TE': 8, 'D/ST': 7, 'K': 8}
+
+def roster_positions(roster_size, position_mix):
+    """Spreads roster_size players over the positions in proportion to position_mix"""
+    total = sum(position_mix.values())
+    counts = {pos: int(roster_size * weight / total) for pos, weight in position_mix.items()}
+
+    # Hand the leftover spots to the positions with the most weight
+    for pos in sorted(position_mix, key=position_mix.get, reverse=True)[:roster_size - sum(counts.values())]:
+        counts[pos] += 1
+    return [pos for pos, count in counts.items() for _ in range(count)]
+
+def misspell(name, rng):
+    """Swaps one letter of a last name, so that matching it takes the fuzzy path"""
+    i = rng.randrange(3, len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+def generate_league(teams=12, roster_size=16, position_mix=None, free_agents=200, misspelled=0.1, seed=0):
+    """Generates a league of made up players, shaped like the league and rankings data fantasytrader caches
+
+    Args:
+        teams (int, optional): Number of teams. Defaults to 12.
+        roster_size (int, optional): Players on each roster. Defaults to 16.
+        position_mix (dict, optional): Relative number of players per ESPN position. Defaults to default_position_mix.
+        free_agents (int, optional): Number of free agents. Defaults to 200.
+        misspelled (float, optional): Fraction of ranked names that differ from their ESPN name. Defaults to 0.1.
+        seed (int, optional): Seeds the generator, so the same arguments give the same league. Defaults to 0.
+
+    Returns:
+        dict: 'rankings' in the form of scrape_all_players, 'teams' in the form of get_league_rosters,
+              'free_agents' in the form of espn_player_info and the 'current_week'
+    """
+    rng = random.Random(seed)
+    position_mix = position_mix or default_position_mix
+    current_week = rng.randint(1, 14)
+
+    # Free agents follow the same mix of positions as rosters
+    positions = [roster_positions(roster_size, position_mix) for _ in range(teams)]
+    positions.append(roster_positions(free_agents, position_mix))
+
+    players_by_position = {pos: list() for pos in position_mix}
+    player_ids = iter(rng.sample(range(1, 10 ** 7), sum(map(len, positions))))
+    rosters = list()
+    for roster in positions:
+        rosters.append(list())
+        for pos in roster:
+            player_id = next(player_ids)
+            if pos == 'D/ST':
+                name = f"Team{player_id}"
+            else:
+                name = f"{rng.choice(string.ascii_uppercase)}. Player{player_id}"
+
+            # Rostered players are projected better than free agents
+            proj_points = round(rng.gammavariate(4, projected_points[pos] / 4) * (1 if len(rosters) <= teams else 0.6), 2)
+            bye_week = rng.randint(5, 14)
+            player = {
+                'player_id': player_id,
+                'name': name,
+                'position': pos,
+                'proj_points': proj_points,
+                'proj_season_points': round(proj_points * rng.uniform(12, 17), 2),
+                'weekly_proj_points': [
+                    [week, round(proj_points * rng.uniform(0.7, 1.3), 2)]
+                    for week in range(current_week, last_week + 1) if week != bye_week
+                ]
+            }
+            rosters[-1].append(player)
+            players_by_position[pos].append(player)
+
+    # Rank every player by their projections, with some disagreement
+    rankings = list()
+    for pos, players in players_by_position.items():
+        players = sorted(players, key=lambda p: p['proj_season_points'] * rng.uniform(0.8, 1.2), reverse=True)
+        for rank, player in enumerate(players):
+            name = player['name']
+            if pos != 'D/ST' and rng.random() < misspelled:
+                name = misspell(name, rng)
+
+            rankings.append({
+                'name': name,
+                'rank': rank,
+                'percentile': rank / len(players),
+                'pos': cbs_positions[pos],
+            })
+
+    return {
+        'rankings': rankings,
+        'teams': [
+            {
+                'team_id': i + 1,
+                'team_abbrev': f"T{i + 1}",
+                'team_name': f"Team {i + 1}",
+                'roster': roster
+            }
+            for i, roster in enumerate(rosters[:teams])
+        ],
+        'free_agents': rosters[teams],
+        'current_week': current_week,
+    }
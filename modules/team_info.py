@@ -1,8 +1,15 @@
 import re
+import numpy as np
+from bisect import insort, bisect_left
+from heapq import merge
 from modules import config
-from modules.player_stats import get_player_info
-from modules.evaluator import player_evaluator, higher_is_better
-from modules.league_info import league
+from modules.player_stats import get_player_info, get_players_info
+from modules.evaluator import evaluate_players, higher_is_better
+from modules.player import Player
+from modules.projections import projection_matrix
+from modules.league_info import get_league, league_cache_key
+from modules.cache import cached
+from modules.profiling import timed, count
 from Levenshtein import ratio
 from functools import cache
 
@@ -16,6 +23,8 @@ positions_on_team = {
     'FLEX': 1
 }
 
+flex_positions = ['RB', 'WR', 'TE']
+
 def espn_to_cbs_name(name:str):
     # CBS only give us first initial and last name
     # and does not include D/ST in the name
@@ -29,7 +38,9 @@ def espn_to_cbs_name(name:str):
     return name.strip()
   
 
-def player_to_dict(player):
+def espn_player_info(player):
+    """Extracts the ESPN side of a player's info, which is what gets cached"""
+    
     # Print the projected points for next game of each player
     proj_points = 0.0
     for _, v in sorted(player.stats.items(), key=lambda x: x[0]):
@@ -37,13 +48,24 @@ def player_to_dict(player):
             proj_points = v['projected_points']
             break
     
+    # And for every week still to be played (week 0 is the whole season)
+    weekly_proj_points = [
+        [week, v['projected_points']] for week, v in sorted(player.stats.items(), key=lambda x: x[0])
+        if week > 0 and 'projected_points' in v and not 'points' in v
+    ]
+    
     # Build basic player dict
-    basic_info = {
+    return {
+        'player_id': player.playerId,
         'name': espn_to_cbs_name(player.name),
         'position': player.position,
         'proj_points': proj_points,
-        'proj_season_points': player.projected_total_points
+        'proj_season_points': player.projected_total_points,
+        'weekly_proj_points': weekly_proj_points
     }
+
+def merge_player_info(basic_info:dict):
+    """Merges a player's ESPN info with their CBS rankings"""
     
     # Grab percentile data from player_stats
     pro_ratings = get_player_info(basic_info['name'], basic_info['position'])
@@ -51,43 +73,70 @@ def player_to_dict(player):
     # Merge dicts
     return {**pro_ratings, **basic_info}
 
+def merge_players_info(basic_infos:list):
+    """merge_player_info for a whole list of players, matching their names in one batch"""
+    pro_ratings = get_players_info([(p['name'], p['position']) for p in basic_infos])
+    return [{**pro, **basic} for pro, basic in zip(pro_ratings, basic_infos)]
+
+def make_players(infos:list):
+    """Builds Players from merged player info, precomputing the lineup slots each can start in"""
+    return [
+        Player.from_dict(info, eligible_slots=(info['position'], 'FLEX') if info['pos'] in flex_positions else (info['position'],))
+        for info in infos
+    ]
+
+def player_to_dict(player):
+    return merge_player_info(espn_player_info(player))
+
+def get_league_rosters():
+    """Returns each team in the league with the ESPN info of its roster, cached on disk"""
+    return cached('league', league_cache_key('teams'), lambda: [
+        {
+            'team_id': team.team_id,
+            'team_abbrev': team.team_abbrev,
+            'team_name': team.team_name,
+            'roster': [espn_player_info(player) for player in team.roster]
+        }
+        for team in get_league().teams
+    ])
+
 @cache
 def get_teams():
     teams = list()
-    my_team_name = config.team_name
-    for team in league.teams:
+    rosters = get_league_rosters()
+    
+    # Match every rostered player at once
+    players = make_players(merge_players_info([player for team in rosters for player in team['roster']]))
+    for team in rosters:
         team_info = {
-            'team_id': team.team_id,
-            'team_abbrev': team.team_abbrev,
-            'team_name': team.team_name,
+            'team_id': team['team_id'],
+            'team_abbrev': team['team_abbrev'],
+            'team_name': team['team_name'],
             'is_my_team': False,
-            'roster': list()
+            'roster': players[:len(team['roster'])]
         }
+        players = players[len(team['roster']):]
         
-        # Extract roster
-        for player in team.roster:
-            team_info['roster'].append(player_to_dict(player))
-            
         teams.append(team_info)
     
-    # Claim the team with a name closest to ours
-    teams = [(t, ratio(t['team_name'].lower(), my_team_name.lower())) for t in teams]
-    teams = sorted(teams, key=lambda x: x[1], reverse=True)
-    teams[0][0]['is_my_team'] = True
-    teams = [t[0] for t in teams]
-    return teams
+    return claim_team(teams, config.team_name)
+
+def claim_team(teams:list, team_name:str):
+    """Orders teams by how closely their name matches team_name, marking the closest as mine"""
+    teams = sorted(teams, key=lambda t: ratio(t['team_name'].lower(), team_name.lower()), reverse=True)
+    return [{**team, 'is_my_team': i == 0} for i, team in enumerate(teams)]
 
 def get_team_lineup(team:dict):
     """Estimates the best lineup for a team"""
     
     players_by_position = {k: list() for k in positions_on_team.keys()}
     for player in team['roster']:
-        players_by_position.setdefault(player['position'], list()).append(player)
+        players_by_position.setdefault(player.position, list()).append(player)
     
     # Note: only the top players of each position are counted
     
     players_by_position = {
-        k: sorted(v, key=player_evaluator, reverse=bool(higher_is_better))
+        k: sorted(v, key=lambda p: p.score, reverse=bool(higher_is_better))
         for k,v in players_by_position.items()
     }
     
@@ -102,8 +151,8 @@ def get_team_lineup(team:dict):
     
     # Grab the best benched player that's RB, WR, or TE -> they're flex
     if 'Bench' in players_by_position:
-        eligible_players = [p for p in players_by_position['Bench'] if p['pos'] in ['RB', 'WR', 'TE']]
-        eligible_players = sorted(eligible_players, key=player_evaluator, reverse=bool(higher_is_better))
+        eligible_players = [p for p in players_by_position['Bench'] if 'FLEX' in p.eligible_slots]
+        eligible_players = sorted(eligible_players, key=lambda p: p.score, reverse=bool(higher_is_better))
         
         flexes = eligible_players[:min(positions_on_team['FLEX'], len(eligible_players))]
         
@@ -124,7 +173,7 @@ def estimate_team_value(team:dict, bench_weight=0):
     for pos, players in lineup.items():
         if pos == 'Bench':
             for player in players:
-                total_value += bench_weight * player_evaluator(player)
+                total_value += bench_weight * player.score
             continue
         
         # If we cannot fill a position, the team is invalid
@@ -132,36 +181,425 @@ def estimate_team_value(team:dict, bench_weight=0):
             return float('-inf') if higher_is_better else float('inf')
         
         for player in players:
-            total_value += player_evaluator(player)
+            total_value += player.score
     
     return total_value #/ len(team['roster'])
 
-def remove_from_team(team:dict, player:dict):
+class TeamValueEngine:
+    """Array-backed lineup evaluation over a fixed pool of players.
+    
+    Every player is scored once into a value vector, rosters are encoded as
+    arrays of indices into the pool and whole batches of rosters are evaluated at once.
+    Lineups and values are exactly those of get_team_lineup and estimate_team_value,
+    including tie-breaking by roster order and the order in which values are summed.
+    Rosters can also be valued by projected points over the rest of the season, week by week.
+    """
+    
+    def __init__(self, players):
+        self.players = list(players)
+        self.index = {p.id: i for i, p in enumerate(self.players)}
+        self.values = evaluate_players(self.players)
+        self.weeks, self.projections = projection_matrix(self.players)
+        
+        # Positions outside of positions_on_team are never started
+        self.positions = list(positions_on_team.keys())
+        for player in self.players:
+            if player.position not in self.positions:
+                self.positions.append(player.position)
+        
+        # The extra, last code marks roster slots that are not filled (ex: dropped players)
+        self.empty_code = len(self.positions)
+        self.position_codes = np.array([self.positions.index(p.position) for p in self.players], dtype=np.intp)
+        self.flex_eligible = np.array(['FLEX' in p.eligible_slots for p in self.players], dtype=bool)
+        self.slots = np.array([
+            positions_on_team.get(pos, 0) if pos != 'FLEX' else 0
+            for pos in self.positions
+        ] + [0], dtype=np.intp)
+        self.required_codes = np.flatnonzero(self.slots > 0)
+        self.flex_slots = positions_on_team['FLEX']
+    
+    def __getstate__(self):
+        # Worker processes only need the arrays, not the players themselves
+        state = self.__dict__.copy()
+        state['players'] = None
+        state['index'] = None
+        return state
+    
+    def roster_indices(self, roster):
+        """Encodes a roster as an array of indices into the player pool"""
+        return np.array([self.index[p.id] for p in roster], dtype=np.intp)
+    
+    def _lineup(self, rosters, active, values=None, maximize=higher_is_better):
+        """Sorts each roster as get_team_lineup does
+        
+        Args:
+            rosters (np.ndarray): (rosters, players) indices into the player pool
+            active (np.ndarray): (rosters, players) mask of players still on each roster
+            values (np.ndarray, optional): (rosters, players) values to pick the lineup by. Defaults to each player's score.
+            maximize (bool, optional): Whether higher values are better. Defaults to higher_is_better.
+        
+        Returns:
+            tuple: The sort order of each roster, the sorted values and lineup masks 
+                   (starters, bench) as well as the flex picks and whether each roster can fill every slot
+        """
+        columns = np.broadcast_to(np.arange(rosters.shape[1]), rosters.shape)
+        values = self.values[rosters] if values is None else values
+        keys = -values if maximize else values
+        codes = np.where(active, self.position_codes[rosters], self.empty_code)
+        
+        # Group by position, best first, ties broken by roster order
+        order = np.lexsort((columns, keys, codes), axis=-1)
+        values = np.take_along_axis(values, order, axis=1)
+        keys = np.take_along_axis(keys, order, axis=1)
+        codes = np.take_along_axis(codes, order, axis=1)
+        
+        # Only the top players of each position start
+        group_start = np.ones(codes.shape, dtype=bool)
+        group_start[:, 1:] = codes[:, 1:] != codes[:, :-1]
+        rank = columns - np.maximum.accumulate(np.where(group_start, columns, 0), axis=1)
+        starters = rank < self.slots[codes]
+        bench = (codes != self.empty_code) & ~starters
+        
+        # The best benched RB, WR or TE are flex, in bench order
+        eligible = bench & self.flex_eligible[np.take_along_axis(rosters, order, axis=1)]
+        flex = np.argsort(np.where(eligible, keys, np.inf), axis=1, kind='stable')[:, :self.flex_slots]
+        flex_filled = np.take_along_axis(eligible, flex, axis=1)
+        np.put_along_axis(bench, flex, ~flex_filled & np.take_along_axis(bench, flex, axis=1), axis=1)
+        
+        feasible = flex_filled.all(axis=1)
+        for code in self.required_codes:
+            feasible &= (codes == code).sum(axis=1) >= self.slots[code]
+        
+        return order, values, keys, starters, bench, flex, flex_filled, feasible
+    
+    @timed('lineup')
+    def lineup_values(self, rosters, active=None, bench_weight=0):
+        """Estimates the value of a batch of rosters, as estimate_team_value does
+        
+        Args:
+            rosters (np.ndarray): (rosters, players) indices into the player pool
+            active (np.ndarray, optional): (rosters, players) mask of players still on each roster. Defaults to all.
+            bench_weight (int, optional): The weight of benched players. Defaults to 0.
+        
+        Returns:
+            np.ndarray: The value of each roster
+        """
+        if active is None: active = np.ones(rosters.shape, dtype=bool)
+        count('lineups evaluated', len(rosters))
+        _, values, _, starters, bench, flex, flex_filled, feasible = self._lineup(rosters, active)
+        return self._lineup_totals(values, starters, bench, flex, flex_filled, feasible, bench_weight)
+    
+    def _lineup_totals(self, values, starters, bench, flex, flex_filled, feasible, bench_weight):
+        # Sum in the same order as estimate_team_value: starters, flex, then bench
+        contributions = np.concatenate([
+            np.where(starters, values, 0),
+            np.where(flex_filled, np.take_along_axis(values, flex, axis=1), 0),
+            np.where(bench, bench_weight * values, 0),
+        ], axis=1)
+        totals = np.cumsum(contributions, axis=1)[:, -1]
+        
+        # If we cannot fill a position, the team is invalid
+        if not feasible.all():
+            totals = totals.astype(float)
+            totals[~feasible] = float('-inf') if higher_is_better else float('inf')
+        return totals
+    
+    def team_value(self, roster, bench_weight=0):
+        """Estimates the value of a single roster of pool indices"""
+        return self.lineup_values(roster[np.newaxis], bench_weight=bench_weight)[0].item()
+    
+    def season_values(self, rosters, active=None):
+        """Projected points of a batch of rosters over the rest of the season
+        
+        Every roster starts its best lineup each week, by that week's projections.
+        All weeks of all rosters are sorted as one batch, and summed in a single reduction.
+        Slots a roster cannot fill in some week simply score nothing that week.
+        
+        Args:
+            rosters (np.ndarray): (rosters, players) indices into the player pool
+            active (np.ndarray, optional): (rosters, players) mask of players still on each roster. Defaults to all.
+        
+        Returns:
+            np.ndarray: The projected points of each roster
+        """
+        if active is None: active = np.ones(rosters.shape, dtype=bool)
+        weeks = len(self.weeks)
+        if weeks == 0: return np.zeros(len(rosters))
+        
+        # One row per roster and week, with that week's projections
+        weekly_rosters = np.repeat(rosters, weeks, axis=0)
+        weekly_active = np.repeat(active, weeks, axis=0)
+        weekly_values = self.projections[rosters].transpose(0, 2, 1).reshape(-1, rosters.shape[1])
+        
+        _, values, _, starters, _, flex, flex_filled, _ = self._lineup(weekly_rosters, weekly_active, weekly_values, maximize=True)
+        # Projections are stored as float32, but summed as float64
+        points = np.where(starters, values, 0).sum(axis=1, dtype=np.float64) + \
+                 np.where(flex_filled, np.take_along_axis(values, flex, axis=1), 0).sum(axis=1, dtype=np.float64)
+        return points.reshape(len(rosters), weeks).sum(axis=1)
+    
+    def season_value(self, roster):
+        """Projected points of a single roster of pool indices over the rest of the season"""
+        return self.season_values(roster[np.newaxis])[0].item()
+    
+    def counted_players(self, roster):
+        """Which players of a roster count towards its value, as its starters or flex"""
+        rosters = roster[np.newaxis]
+        order, _, _, starters, _, flex, flex_filled, _ = self._lineup(rosters, np.ones(rosters.shape, dtype=bool))
+        np.put_along_axis(starters, flex, flex_filled | np.take_along_axis(starters, flex, axis=1), axis=1)
+        
+        counted = np.zeros(len(roster), dtype=bool)
+        counted[order[0]] = starters[0]
+        return counted
+    
+    @timed('lineup')
+    def values_after_drops(self, rosters, max_size, bench_weight=0):
+        """Values a batch of full rosters after each drops its worst benched players down to max_size
+        
+        Dropping a benched player never changes who starts, so one lineup is enough:
+        the players dropped are the worst benched ones, ties broken by bench order,
+        exactly those that dropping the worst benched player one at a time would give.
+        Their values are then left out of the bench, which sums the same as valuing the smaller roster.
+        Rosters that run out of benched players keep the rest.
+        
+        Args:
+            rosters (np.ndarray): (rosters, players) indices into the player pool
+            max_size (int): The most players a roster may keep
+            bench_weight (int, optional): The weight of benched players. Defaults to 0.
+        
+        Returns:
+            tuple: The value of each roster and a (rosters, drops) array of dropped pool indices, worst first, padded with -1
+        """
+        count('lineups evaluated', len(rosters))
+        order, values, keys, starters, bench, flex, flex_filled, feasible = self._lineup(rosters, np.ones(rosters.shape, dtype=bool))
+        
+        # Benched players, worst first and in bench order among equals
+        excess = max(rosters.shape[1] - max_size, 0)
+        worst_first = np.argsort(np.where(bench, -keys, np.inf), axis=1, kind='stable')[:, :excess]
+        dropping = np.arange(excess) < np.minimum(excess, bench.sum(axis=1))[:, np.newaxis]
+        np.put_along_axis(bench, worst_first, np.take_along_axis(bench, worst_first, axis=1) & ~dropping, axis=1)
+        
+        drops = np.where(dropping, np.take_along_axis(rosters, np.take_along_axis(order, worst_first, axis=1), axis=1), -1)
+        return self._lineup_totals(values, starters, bench, flex, flex_filled, feasible, bench_weight), drops
+    
+    def same_position_trades(self, to_swap, to_receive):
+        """Flags trades where every player involved plays the same position
+        
+        Args:
+            to_swap (np.ndarray): (trades, a) pool indices given away
+            to_receive (np.ndarray): (trades, b) pool indices received
+        """
+        swap_codes = self.position_codes[to_swap]
+        receive_codes = self.position_codes[to_receive]
+        return (swap_codes == swap_codes[:, :1]).all(axis=1) & (receive_codes == swap_codes[:, :1]).all(axis=1)
+    
+    @timed('trade evaluation')
+    def evaluate_trades(self, my_roster, other_roster, to_swap, to_receive, max_team_size, bench_weight=0):
+        """Evaluates a batch of equally-sized trades between two rosters
+        
+        Rosters are rebuilt as remove_from_team and add_to_team would,
+        and each side drops its worst benched players until it fits max_team_size.
+        
+        Args:
+            my_roster (np.ndarray): Pool indices of my roster
+            other_roster (np.ndarray): Pool indices of the other roster
+            to_swap (np.ndarray): (trades, a) positions in my_roster to give away
+            to_receive (np.ndarray): (trades, b) positions in other_roster to receive
+            max_team_size (int): The largest roster my team may keep
+            bench_weight (int, optional): The weight of the other team's bench. Defaults to 0.
+        
+        Returns:
+            tuple: My post-trade values, their post-trade values and the pool indices each side drops, padded with -1
+        """
+        trades = np.arange(len(to_swap))[:, np.newaxis]
+        my_kept = np.ones((len(to_swap), len(my_roster)), dtype=bool)
+        my_kept[trades, to_swap] = False
+        other_kept = np.ones((len(to_receive), len(other_roster)), dtype=bool)
+        other_kept[trades, to_receive] = False
+        
+        # Kept players stay in roster order, new players are appended
+        my_post = np.concatenate([
+            np.broadcast_to(my_roster, my_kept.shape)[my_kept].reshape(len(to_swap), -1),
+            other_roster[to_receive]
+        ], axis=1)
+        other_post = np.concatenate([
+            np.broadcast_to(other_roster, other_kept.shape)[other_kept].reshape(len(to_receive), -1),
+            my_roster[to_swap]
+        ], axis=1)
+        
+        my_values, my_drops = self.values_after_drops(my_post, max_team_size)
+        other_values, other_drops = self.values_after_drops(other_post, max_team_size, bench_weight)
+        return my_values, other_values, my_drops, other_drops
+
+class IncrementalLineup:
+    """A roster kept as per-position sorted lists, with its starter, flex and bench boundaries
+    
+    Only the top few players of each position decide the lineup, so the value after
+    adding and removing k players is found by walking the heads of the touched positions,
+    in O(k log n) and without building a new team.
+    Players are indices into a TeamValueEngine's pool.
+    """
+    
+    def __init__(self, engine, roster):
+        self.engine = engine
+        self.by_position = {code: list() for code in range(len(engine.positions))}
+        self.entries = dict() # pool index -> sorted list entry
+        self.next_seq = 0
+        self.total = 0
+        self.summaries = dict()
+        for index in roster:
+            self._insert(index)
+    
+    def _entry(self, index, seq):
+        value = self.engine.values[index].item()
+        return (-value if higher_is_better else value, seq, index)
+    
+    def _insert(self, index):
+        entry = self._entry(index, self.next_seq)
+        self.next_seq += 1
+        
+        code = int(self.engine.position_codes[index])
+        insort(self.by_position[code], entry)
+        self.entries[index] = entry
+        self.total += self.engine.values[index].item()
+        self.summaries.pop(code, None)
+    
+    def _delete(self, index):
+        entry = self.entries.pop(index)
+        
+        code = int(self.engine.position_codes[index])
+        entries = self.by_position[code]
+        del entries[bisect_left(entries, entry)]
+        self.total -= self.engine.values[index].item()
+        self.summaries.pop(code, None)
+    
+    def _summarize(self, code, entries):
+        """Sums the starters of a position and finds its flex candidates, reading only the head of its sorted entries
+        
+        Returns:
+            tuple: (starter value, number of starters, flex candidates as (key, code, seq, value))
+        """
+        slots = self.engine.slots[code]
+        flex_slots = self.engine.flex_slots
+        
+        starter_value, starters, candidates = 0, 0, list()
+        for key, seq, index in entries:
+            if starters < slots:
+                starter_value += self.engine.values[index].item()
+                starters += 1
+            elif len(candidates) < flex_slots:
+                if self.engine.flex_eligible[index]:
+                    candidates.append((key, code, seq, self.engine.values[index].item()))
+            else:
+                break
+        return starter_value, starters, candidates
+    
+    def _summary(self, code):
+        if code not in self.summaries:
+            self.summaries[code] = self._summarize(code, self.by_position[code])
+        return self.summaries[code]
+    
+    def value_after(self, remove=(), add=(), bench_weight=0):
+        """Estimates the team value after removing and adding players, without changing the lineup
+        
+        Args:
+            remove (Iterable[int], optional): Pool indices to remove. Defaults to none.
+            add (Iterable[int], optional): Pool indices to append to the roster, in order. Defaults to none.
+            bench_weight (int, optional): The weight of benched players. Defaults to 0.
+        
+        Returns:
+            float: The new team value, as estimate_team_value would give
+        """
+        count('incremental lineups')
+        removed = set(remove)
+        added = [self._entry(index, self.next_seq + i) for i, index in enumerate(add)]
+        
+        touched = {int(self.engine.position_codes[index]) for index in removed}
+        touched.update(int(self.engine.position_codes[index]) for _, _, index in added)
+        
+        total = self.total
+        total -= sum(self.engine.values[index].item() for index in removed)
+        total += sum(self.engine.values[index].item() for _, _, index in added)
+        
+        starter_value, flex_candidates, feasible = 0, list(), True
+        for code in self.by_position:
+            if code in touched:
+                entries = merge(
+                    (entry for entry in self.by_position[code] if entry[2] not in removed),
+                    sorted(entry for entry in added if self.engine.position_codes[entry[2]] == code)
+                )
+                code_value, starters, candidates = self._summarize(code, entries)
+            else:
+                code_value, starters, candidates = self._summary(code)
+            
+            # If we cannot fill a position, the team is invalid
+            if starters < self.engine.slots[code]:
+                feasible = False
+            starter_value += code_value
+            flex_candidates += candidates
+        
+        flexes = sorted(flex_candidates)[:self.engine.flex_slots]
+        if not feasible or len(flexes) < self.engine.flex_slots:
+            return float('-inf') if higher_is_better else float('inf')
+        
+        flex_value = sum(value for _, _, _, value in flexes)
+        return starter_value + flex_value + bench_weight * (total - starter_value - flex_value)
+    
+    def value(self, bench_weight=0):
+        """Estimates the current team value"""
+        return self.value_after(bench_weight=bench_weight)
+    
+    def apply(self, remove=(), add=()):
+        """Removes and then appends players to the roster"""
+        for index in remove:
+            self._delete(index)
+        for index in add:
+            self._insert(index)
+    
+    def roster(self):
+        """The players on the roster, in roster order"""
+        indices = sorted(self.entries, key=lambda index: self.entries[index][1])
+        return [self.engine.players[index] for index in indices]
+
+def remove_from_team(team:dict, player:Player):
     """Removes a player from a team, returing a copy
-    Note that the player must be a player on the team EXACTLY as it appears in the roster
+    Note that the player must be the same Player object as it appears in the roster
     """
     
     team = team.copy()
-    team['roster'] = [p for p in team['roster'] if p != player]
+    team['roster'] = [p for p in team['roster'] if p is not player]
     return team
 
-def add_to_team(team:dict, player:dict):
+def add_to_team(team:dict, player:Player):
     """Adds a player to a team, returing a copy
-    Note that the player must be a player on the team EXACTLY as it appears in the roster
+    Note that the player must be the same Player object as it appears in the roster
     """
     
     team = team.copy()
     team['roster'].append(player)
     return team
 
+def plan_drops(team:dict, max_size:int):
+    """Picks the players to drop for a team to fit max_size, from a single lineup
+    These are the players that dropping the worst benched player, one at a time, would drop.
+    
+    Returns:
+        list[Player]: The players to drop, worst first. Fewer than needed if the bench runs out.
+    """
+    excess = len(team['roster']) - max_size
+    if excess <= 0: return list()
+    
+    # Dropping a benched player never changes who starts, so the bench only needs sorting once
+    bench = get_team_lineup(team)['Bench']
+    return sorted(bench, key=lambda p: p.score, reverse=not higher_is_better)[:excess]
+
 def print_team(team:dict, scores=True, lineup=True):
     output = f"{team['team_name']}"
     
     if not lineup:
         for player in team['roster']:
-            output += f"\n\t{player['name']} ({player['position']})"
+            output += f"\n\t{player.name} ({player.position})"
             if scores:
-                output += f" - {player_evaluator(player)}"
+                output += f" - {player.score}"
     
     if lineup:
         lineup = get_team_lineup(team)
@@ -172,16 +610,18 @@ def print_team(team:dict, scores=True, lineup=True):
                 output += f"\n\tNone"
             
             for player in players:
-                output += f"\n\t{player['name']} ({player['pos']}) - {player_evaluator(player)}"
+                output += f"\n\t{player.name} ({player.pos}) - {player.score}"
     
     if scores: output += f"\n\nOverall value: {estimate_team_value(team)}"
     
     return output
 
-@cache
+def free_agents_cache_key():
+    return league_cache_key(f"free_agents/{config.free_agent_pool_size}")
+
 def get_free_agents():
     """Returns an unranked list of free agent names and positions"""
-    free_agents = list()
-    for player in league.free_agents(size=200):
-        free_agents.append(player_to_dict(player))
-    return free_agents
\ No newline at end of file
+    free_agents = cached('league', free_agents_cache_key(), lambda: [
+        espn_player_info(player) for player in get_league().free_agents(size=config.free_agent_pool_size)
+    ])
+    return make_players(merge_players_info(free_agents))
\ No newline at end of file
@@ -0,0 +1,40 @@
+from heapq import heappush, heappushpop
+from itertools import count
+
+from modules.evaluator import higher_is_better
+
+class TopTrades:
+    """Keeps the best k trades by my_delta, out of any number pushed
+
+    Trades with the same my_delta are ranked in the order they were pushed,
+    so best() is the first k trades of a stable sort of everything pushed.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.heap = list() # The worst kept trade is always at heap[0]
+        self.seen = 0
+        self.order = count()
+
+    def key(self, trade):
+        return (trade['my_delta'] if higher_is_better else -trade['my_delta'], -next(self.order))
+
+    def push(self, trade):
+        self.seen += 1
+        if self.k <= 0: return
+        entry = (*self.key(trade), trade)
+        if len(self.heap) < self.k:
+            heappush(self.heap, entry)
+        elif entry[:2] > self.heap[0][:2]:
+            heappushpop(self.heap, entry)
+
+    def extend(self, trades):
+        for trade in trades:
+            self.push(trade)
+
+    def best(self):
+        """The kept trades, best first"""
+        return [entry[-1] for entry in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
+
+    def __len__(self):
+        return len(self.heap)
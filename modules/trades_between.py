@@ -1,4 +1,10 @@
 from itertools import product, combinations
+from math import comb
+import numpy as np
+
+from modules import config
+from modules.evaluator import higher_is_better
+from modules.profiling import timed
 
 def generate_trades_between(roster_1, roster_2, max_players=2):
     """Generates all possible combinations of size 1 to max_per_side of players to trade between two rosters"""
@@ -8,5 +14,147 @@ def generate_trades_between(roster_1, roster_2, max_players=2):
         for to_swap, to_receive in product(combinations(roster_1, from_1), combinations(roster_2, from_2)):
             yield to_swap, to_receive
 
+@timed('trade bounds')
+def removal_bounds(engine, roster, subsets, candidates, bench_weight=0):
+    """Values a roster without each subset of its players, and the gain of then adding each candidate
+    
+    Args:
+        engine (TeamValueEngine): The engine holding every player
+        roster (np.ndarray): Pool indices of the roster
+        subsets (np.ndarray): (subsets, size) positions in the roster to remove
+        candidates (np.ndarray): Pool indices of the players that could be added
+        bench_weight (int, optional): The weight of benched players. Defaults to 0.
+    
+    Returns:
+        tuple: The value without each subset and the (subsets, candidates) gain of adding each candidate.
+               Gains are infinite where the roster without the subset cannot fill its lineup.
+    """
+    kept = np.ones((len(subsets), len(roster)), dtype=bool)
+    kept[np.arange(len(subsets))[:, np.newaxis], subsets] = False
+    kept_rosters = np.broadcast_to(roster, kept.shape)[kept].reshape(len(subsets), -1)
+    base = engine.lineup_values(kept_rosters, bench_weight=bench_weight)
+    
+    with_candidate = np.concatenate([
+        np.repeat(kept_rosters, len(candidates), axis=0),
+        np.tile(candidates, len(subsets))[:, np.newaxis]
+    ], axis=1)
+    values = engine.lineup_values(with_candidate, bench_weight=bench_weight).reshape(len(subsets), len(candidates))
+    
+    finite = np.isfinite(base)
+    gains = np.full(values.shape, np.inf)
+    gains[finite] = np.maximum(values[finite] - base[finite, np.newaxis], 0)
+    return base, gains
+
+@timed('trade bounds')
+def bounded_combinations(gains, size, limit):
+    """Finds every combination of size indices whose gains sum to more than limit
+    Gains are searched best-first, so whole branches are cut as soon as the best completion cannot pass the limit
+
+    Returns:
+        tuple: The passing combinations, in the order of itertools.combinations, and how many were pruned
+    """
+    order = sorted(range(len(gains)), key=lambda i: -gains[i])
+    sorted_gains = [gains[i] for i in order]
+    found, pruned = list(), 0
+    
+    def search(start, chosen, total):
+        nonlocal pruned
+        needed = size - len(chosen)
+        if needed == 0:
+            found.append(tuple(sorted(order[i] for i in chosen)))
+            return
+        
+        for i in range(start, len(sorted_gains) - needed + 1):
+            # The best completion from here takes the next best gains
+            if total + sum(sorted_gains[i:i + needed]) <= limit:
+                pruned += comb(len(sorted_gains) - i, needed)
+                break
+            search(i + 1, chosen + [i], total + sorted_gains[i])
+    
+    search(0, [], 0)
+    return sorted(found), pruned
+
+def generate_pruned_trade_batches(engine, my_roster, other_roster, max_players=2, bench_weight=0, batch_size=4096, stats=None):
+    """Generates the trades of generate_trades_between that can still be mutual, as batches of roster positions, using branch and bound
+    
+    Team values are submodular: the gain of adding several players is at most the sum of their gains alone.
+    Each side's post-trade value is bounded by its value without the players it gives away
+    plus the gains of the players it receives, and trades whose bounds cannot satisfy
+    is_trade_mutual are skipped without being evaluated. Trades between the same position are skipped too.
+    Bounds need non-negative player values and a bench weight between 0 and 1; otherwise only the
+    position filter applies.
+    
+    Args:
+        engine (TeamValueEngine): The engine holding every player
+        my_roster (np.ndarray): Pool indices of my roster
+        other_roster (np.ndarray): Pool indices of the other roster
+        max_players (int, optional): As in generate_trades_between. Defaults to 2.
+        bench_weight (int, optional): The weight of the other team's bench. Defaults to 0.
+        batch_size (int, optional): The most trades per batch. Defaults to 4096.
+        stats (dict, optional): Incremented with the number of 'candidates', 'pruned' and 'evaluated' trades.
+    """
+    stats = stats if stats is not None else dict()
+    for key in ('candidates', 'pruned', 'evaluated'):
+        stats.setdefault(key, 0)
+    
+    # is_trade_mutual needs my value to rise and theirs to stay within the trade edge
+    pre_swap_my_value = engine.team_value(my_roster)
+    pre_swap_other_value = engine.team_value(other_roster, bench_weight=bench_weight)
+    edge_percentage = 1 + config.maximum_trade_edge
+    my_limit = pre_swap_my_value - 1e-9 * max(1, abs(pre_swap_my_value))
+    other_limit = pre_swap_other_value - 1e-9 * max(1, abs(pre_swap_other_value))
+    
+    can_prune = higher_is_better and len(engine.values) > 0 and engine.values.min() >= 0 and 0 <= bench_weight <= 1
+    my_bounds, other_bounds = dict(), dict()
+    
+    for from_1, from_2 in product(range(1, max_players), range(1, max_players)):
+        if from_1 + from_2 > max_players: continue
+        
+        swaps = np.array(list(combinations(range(len(my_roster)), from_1)), dtype=np.intp).reshape(-1, from_1)
+        receives = np.array(list(combinations(range(len(other_roster)), from_2)), dtype=np.intp).reshape(-1, from_2)
+        receive_rows = {tuple(r): j for j, r in enumerate(receives.tolist())}
+        stats['candidates'] += len(swaps) * len(receives)
+        
+        if can_prune:
+            if from_1 not in my_bounds:
+                my_bounds[from_1] = removal_bounds(engine, my_roster, swaps, other_roster)
+            if from_2 not in other_bounds:
+                other_bounds[from_2] = removal_bounds(engine, other_roster, receives, my_roster, bench_weight)
+            my_base, my_gains = my_bounds[from_1]
+            other_base, other_gains = other_bounds[from_2]
+        
+        batch_swaps, batch_receives = list(), list()
+        for i, to_swap in enumerate(swaps):
+            rows = np.arange(len(receives))
+            if can_prune and np.isfinite(my_base[i]):
+                # Only sets of received players that could raise my value
+                passing, pruned = bounded_combinations(my_gains[i].tolist(), from_2, my_limit - my_base[i])
+                rows = np.array([receive_rows[r] for r in passing], dtype=np.intp)
+                stats['pruned'] += pruned
+            
+            if can_prune and len(rows):
+                # ...and that leave the other team within the trade edge
+                their_base = other_base[rows]
+                their_bound = np.where(np.isfinite(their_base), their_base, 0) + other_gains[rows][:, to_swap].sum(axis=1)
+                acceptable = ~(edge_percentage * their_bound < other_limit)
+                stats['pruned'] += int((~acceptable).sum())
+                rows = rows[acceptable]
+            
+            # Skip all trades between the same position
+            to_swap = np.broadcast_to(to_swap, (len(rows), from_1))
+            to_receive = receives[rows]
+            different_positions = ~engine.same_position_trades(my_roster[to_swap], other_roster[to_receive])
+            stats['pruned'] += int((~different_positions).sum())
+            stats['evaluated'] += int(different_positions.sum())
+            
+            batch_swaps.append(to_swap[different_positions])
+            batch_receives.append(to_receive[different_positions])
+            if sum(map(len, batch_swaps)) >= batch_size:
+                yield np.concatenate(batch_swaps), np.concatenate(batch_receives)
+                batch_swaps, batch_receives = list(), list()
+        
+        if sum(map(len, batch_swaps)):
+            yield np.concatenate(batch_swaps), np.concatenate(batch_receives)
+
 if __name__ == "__main__":
-    print('\n'.join(map(str, generate_trades_between([1,2,3,4], [5,6,7,8], max_players=3))))
\ No newline at end of file
+    print('\n'.join(map(str, generate_trades_between([1,2,3,4], [5,6,7,8], max_players=3))))
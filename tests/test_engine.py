@@ -0,0 +1,364 @@
+import json
+import random
+import threading
+from http.server import HTTPServer
+from itertools import combinations
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import numpy as np
+import pytest
+from Levenshtein import ratio
+
+from modules import config, evaluator_cache
+from modules.cache import store, set_cache_mode, open_connection
+from modules.evaluator import is_trade_mutual, is_beneficial
+from modules.evaluator_cache import invalidate, cached_score
+from modules.league_info import league_cache_key, get_current_week
+from modules.player_stats import get_all_players, get_name_index, search_player_info, rankings_cache_key, parse_rankings
+from modules.synthetic_league import generate_league, cbs_positions
+from modules.team_info import get_teams, get_free_agents, free_agents_cache_key, estimate_team_value, plan_drops, TeamValueEngine, IncrementalLineup
+from modules.trades_between import generate_trades_between
+from modules.simulation import generate_mutual_trades, simulate_trades_with_all
+from modules.free_agents import find_free_agent_swaps
+from modules.selection import select_trades, trade_changes
+from modules.server import LeagueState, RequestHandler
+from modules.top_trades import TopTrades
+
+# Every roster is full, so uneven trades force drops
+roster_size = 12
+position_mix = {'QB': 2, 'RB': 3, 'WR': 3, 'TE': 2, 'D/ST': 1, 'K': 1}
+
+def clear_caches():
+    for function in (open_connection, get_all_players, get_name_index, search_player_info, get_teams, get_current_week):
+        function.cache_clear()
+    invalidate()
+
+@pytest.fixture(scope='module')
+def league(tmp_path_factory):
+    """A synthetic league served through the cache, as benchmark.py serves it"""
+    raw = generate_league(teams=3, roster_size=roster_size, position_mix=position_mix, free_agents=40, seed=3)
+    overrides = {
+        'cache_path': str(tmp_path_factory.mktemp('cache') / 'test.db'),
+        'league_id': 'synthetic-test',
+        'team_name': raw['teams'][0]['team_name'],
+        'free_agent_pool_size': 40,
+    }
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    clear_caches()
+
+    store('rankings', rankings_cache_key(), raw['rankings'])
+    store('league', league_cache_key('teams'), raw['teams'])
+    store('league', free_agents_cache_key(), raw['free_agents'])
+    store('league', league_cache_key('current_week'), raw['current_week'])
+    set_cache_mode(use_offline=True)
+
+    teams, free_agents = get_teams(), get_free_agents()
+    engine = TeamValueEngine([player for team in teams for player in team['roster']] + free_agents)
+    yield {'raw': raw, 'teams': teams, 'free_agents': free_agents, 'engine': engine}
+
+    set_cache_mode()
+    for name in overrides:
+        delattr(config, name)
+    clear_caches()
+
+def test_engine_matches_estimate_team_value(league):
+    engine = league['engine']
+    rng = random.Random(0)
+    teams = league['teams'] + [{'roster': rng.sample(engine.players, roster_size)} for _ in range(20)]
+    for team in teams:
+        for bench_weight in (0, config.opponent_bench_weight):
+            assert engine.team_value(engine.roster_indices(team['roster']), bench_weight) == estimate_team_value(team, bench_weight)
+
+def brute_force_trades(engine, my_team, other_team, max_trade_size, bench_weight):
+    """Every mutual trade, found by rebuilding and valuing both teams for each trade"""
+    my_roster, other_roster = my_team['roster'], other_team['roster']
+    pre_my_value = estimate_team_value(my_team)
+    pre_other_value = estimate_team_value(other_team, bench_weight)
+
+    trades = dict()
+    for to_swap, to_receive in generate_trades_between(my_roster, other_roster, max_trade_size):
+        positions = {player.position for player in (*to_swap, *to_receive)}
+        if len(positions) == 1: continue # The search skips trades within a single position
+
+        my_post = {'roster': [p for p in my_roster if p not in to_swap] + list(to_receive)}
+        other_post = {'roster': [p for p in other_roster if p not in to_receive] + list(to_swap)}
+        to_drop, their_drop = plan_drops(my_post, roster_size), plan_drops(other_post, roster_size)
+        my_value = estimate_team_value({'roster': [p for p in my_post['roster'] if p not in to_drop]})
+        other_value = estimate_team_value({'roster': [p for p in other_post['roster'] if p not in their_drop]}, bench_weight)
+
+        if is_trade_mutual(pre_my_value, my_value, pre_other_value, other_value):
+            key = (tuple(engine.roster_indices(to_swap).tolist()), tuple(engine.roster_indices(to_receive).tolist()))
+            trades[key] = {
+                'to_drop': engine.roster_indices(to_drop).tolist(),
+                'their_drop': engine.roster_indices(their_drop).tolist(),
+                'my_delta': my_value - pre_my_value,
+                'their_delta': other_value - pre_other_value,
+            }
+    return trades
+
+@pytest.mark.parametrize('max_trade_size', [3, 4])
+def test_pruned_search_matches_brute_force(league, max_trade_size):
+    engine = league['engine']
+    my_team, other_team = league['teams'][0], league['teams'][1]
+    bench_weight = config.opponent_bench_weight
+
+    expected = brute_force_trades(engine, my_team, other_team, max_trade_size, bench_weight)
+    found = {
+        (trade['to_giveaway'], trade['to_receive']): {key: trade[key] for key in ('to_drop', 'their_drop', 'my_delta', 'their_delta')}
+        for trade in generate_mutual_trades(engine, engine.roster_indices(my_team['roster']), engine.roster_indices(other_team['roster']),
+                                            max_trade_size, roster_size, bench_weight=bench_weight)
+    }
+    assert expected
+    assert any(trade['to_drop'] for trade in expected.values())
+    assert found.keys() == expected.keys()
+    for key, trade in expected.items():
+        assert found[key]['to_drop'] == trade['to_drop'] and found[key]['their_drop'] == trade['their_drop']
+        assert found[key]['my_delta'] == pytest.approx(trade['my_delta'])
+        assert found[key]['their_delta'] == pytest.approx(trade['their_delta'])
+
+def test_reused_simulations_match_fresh_ones(league):
+    engine = league['engine']
+    my_roster, *other_rosters = [engine.roster_indices(team['roster']) for team in league['teams']]
+
+    def simulate(rosters, reuse):
+        return list(simulate_trades_with_all(engine, my_roster, rosters, 3, roster_size, bench_weight=config.opponent_bench_weight, reuse=reuse))
+
+    def without_reused(results):
+        return [(trades, {key: value for key, value in stats.items() if key != 'reused'}) for trades, stats in results]
+
+    fresh = simulate(other_rosters, reuse=False)
+    first, second = simulate(other_rosters, reuse=True), simulate(other_rosters, reuse=True)
+    assert all(trades for trades, _ in fresh)
+    assert first == fresh
+    assert without_reused(second) == fresh and all(stats['reused'] for _, stats in second)
+
+    # After a roster move, only that team is simulated again
+    changed = other_rosters[0].copy()
+    changed[0] = engine.index[league['free_agents'][0].id]
+    results = simulate([changed, other_rosters[1]], reuse=True)
+    assert [stats.get('reused', False) for _, stats in results] == [False, True]
+    assert without_reused(results) == simulate([changed], reuse=False) + fresh[1:]
+
+def test_free_agent_scan_matches_naive_scan(league):
+    engine, roster, free_agents = league['engine'], league['teams'][0]['roster'], league['free_agents']
+    pre_value = estimate_team_value({'roster': roster})
+
+    expected = list()
+    for player in roster:
+        for free_agent in free_agents:
+            value = estimate_team_value({'roster': [p for p in roster if p is not player] + [free_agent]})
+            if is_beneficial(pre_value, value):
+                expected.append((engine.index[player.id], engine.index[free_agent.id], value - pre_value))
+
+    swaps = find_free_agent_swaps(engine, engine.roster_indices(roster), engine.roster_indices(free_agents))
+    assert expected
+    assert [(*swap['to_giveaway'], *swap['to_receive'], swap['my_delta']) for swap in swaps] == expected
+
+def test_name_index_matches_levenshtein(league):
+    rankings = get_all_players()
+    queries = [(player['name'], cbs_positions[player['position']])
+               for team in league['raw']['teams'] for player in team['roster']]
+
+    index = get_name_index()
+    fuzzy = 0
+    for name, pos in queries:
+        candidates = [player for player in rankings if player['pos'] == pos]
+        scores = [ratio(name.lower(), player['name'].lower()) for player in candidates]
+        expected = [player for player, score in zip(candidates, scores) if score == max(scores)]
+        fuzzy += max(scores) < 1
+        assert index.search(name, pos) == expected
+    assert fuzzy
+
+rankings_page = b"""<html><body>
+<div class="experts-column-header">Experts</div>
+<div class="experts-column triple">
+  <div class="player"><a href="/1"> T. Hill </a></div>
+  <div class="player"><span>Tier 2</span></div>
+  <div class="player"><a href="/2">J.  Allen</a><a href="/3">Team</a></div>
+  <div class="player"><a href="/4">C. Lamb</a></div>
+</div>
+<div class="experts-column">
+  <div class="player"><a href="/4">C. Lamb</a></div>
+  <div class="player"><a href="/1">T. Hill</a></div>
+</div>
+<div class="experts-column">
+  <div class="player"><span>Tier 1</span></div>
+  <div class="player"><a href="/2">J.  Allen</a></div>
+  <div class="player"><a href="/5">D. Adams</a></div>
+  <div class="player"><a href="/1">T. Hill</a></div>
+</div>
+</body></html>"""
+
+def test_parse_rankings():
+    expected = [
+        {'name': 'T. Hill', 'rank': 0, 'percentile': 0 / 4, 'pos': 'WR'},
+        {'name': 'J.  Allen', 'rank': 2, 'percentile': 2 / 4, 'pos': 'WR'},
+        {'name': 'C. Lamb', 'rank': 3, 'percentile': 3 / 4, 'pos': 'WR'},
+    ]
+    assert parse_rankings(rankings_page, 'WR') == expected
+
+    # Each expert's rank counts the rows without a player, as the consensus rank does
+    expert_ranks = [[1, 3], [None, 1], [0, None]]
+    assert parse_rankings(rankings_page, 'WR', expert_ranks=True) == [
+        {**player, 'expert_ranks': ranks} for player, ranks in zip(expected, expert_ranks)
+    ]
+
+    with pytest.raises(ValueError):
+        parse_rankings(b'<html><body><div class="experts-column">x</div></body></html>', 'WR')
+
+def test_season_values_match_weekly_lineups(league):
+    engine = league['engine']
+    rosters = [engine.roster_indices(team['roster']) for team in league['teams']]
+
+    for roster in rosters:
+        expected = 0
+        for week in range(len(engine.weeks)):
+            points = engine.projections[roster, week].astype(np.float64)
+            benched = list()
+            for code in range(len(engine.positions)):
+                players = sorted(np.flatnonzero(engine.position_codes[roster] == code), key=lambda i: -points[i])
+                expected += sum(points[i] for i in players[:engine.slots[code]])
+                benched += [i for i in players[engine.slots[code]:] if engine.flex_eligible[roster[i]]]
+            expected += sum(sorted((points[i] for i in benched), reverse=True)[:engine.flex_slots])
+
+        assert engine.season_value(roster) == pytest.approx(expected)
+    assert engine.weeks
+
+def sampled_trades(league, count=14):
+    """A sample of the mutual trades with every other team, as fantasytrader passes them to select_trades"""
+    engine, my_roster = league['engine'], league['engine'].roster_indices(league['teams'][0]['roster'])
+    trades = [
+        {**trade, **{key: [engine.players[j] for j in trade[key]] for key in ('to_giveaway', 'to_receive', 'to_drop', 'their_drop')}}
+        for other_team in league['teams'][1:]
+        for trade in generate_mutual_trades(engine, my_roster, engine.roster_indices(other_team['roster']), 3, roster_size,
+                                            bench_weight=config.opponent_bench_weight)
+    ]
+    return random.Random(0).sample(trades, count)
+
+def test_selection_matches_brute_force(league):
+    engine = league['engine']
+    my_roster = engine.roster_indices(league['teams'][0]['roster'])
+    trades = sampled_trades(league)
+
+    lineup = IncrementalLineup(engine, my_roster)
+    changes = [trade_changes(engine, trade) for trade in trades]
+    best = lineup.value()
+    for size in range(1, len(trades) + 1):
+        for chosen in combinations(changes, size):
+            players = [player for _, _, ids in chosen for player in ids]
+            if len(players) == len(set(players)):
+                best = max(best, lineup.value_after(remove=[p for to_remove, _, _ in chosen for p in to_remove],
+                                                    add=[p for _, to_add, _ in chosen for p in to_add]))
+
+    selection = select_trades(engine, lineup, trades)
+    assert selection['complete']
+    assert selection['value'] == best > lineup.value()
+
+def test_selection_stops_at_node_limit(league):
+    engine = league['engine']
+    lineup = IncrementalLineup(engine, engine.roster_indices(league['teams'][0]['roster']))
+    trades = sampled_trades(league, 40)
+
+    assert select_trades(engine, lineup, trades)['nodes'] > 3
+    selection = select_trades(engine, lineup, trades, node_limit=3)
+    assert selection['nodes'] == 3 and not selection['complete']
+
+def test_selection_never_receives_a_dropped_player(league):
+    engine = league['engine']
+    lineup = IncrementalLineup(engine, engine.roster_indices(league['teams'][0]['roster']))
+    trades = sampled_trades(league, 40)
+    dropping, dropped = next((i, player) for i, trade in enumerate(trades)
+                             for player in trade['their_drop'] if player not in trade['to_giveaway'])
+
+    # One of their own players they drop, picked up on their own, as another trade with the same team
+    pickup = {'to_giveaway': (), 'to_receive': (dropped,), 'to_drop': [], 'their_drop': [], 'my_delta': 0, 'their_delta': 0}
+    trades.append(pickup)
+
+    assert dropped.id in trade_changes(engine, trades[dropping])[2] & trade_changes(engine, pickup)[2]
+    assert not {dropping, len(trades) - 1} <= set(select_trades(engine, lineup, trades)['chosen'])
+
+def test_selection_order_keeps_every_step_valid(league):
+    engine, my_roster = league['engine'], league['teams'][0]['roster']
+    lineup = IncrementalLineup(engine, engine.roster_indices(my_roster))
+    others = [player for team in league['teams'][1:] for player in team['roster']]
+
+    # Giving away my only kicker leaves no valid lineup, until a later trade brings in another
+    kicker = next(player for player in my_roster if player.position == 'K')
+    value = lambda player: engine.values[engine.index[player.id]]
+    best_player = max((player for player in others if player.position in ('RB', 'WR', 'TE')), key=value)
+    benched = min((player for player in my_roster if player.position not in ('K', best_player.position)), key=value)
+    new_kicker = max((player for player in others if player.position == 'K'), key=value)
+    trades = [
+        {'to_giveaway': (kicker,), 'to_receive': (best_player,), 'to_drop': [], 'their_drop': [], 'my_delta': 0, 'their_delta': 0},
+        {'to_giveaway': (benched,), 'to_receive': (new_kicker,), 'to_drop': [], 'their_drop': [], 'my_delta': 0, 'their_delta': 0},
+    ]
+    assert lineup.value_after(remove=engine.roster_indices([kicker]).tolist(), add=engine.roster_indices([best_player]).tolist()) == float('-inf')
+
+    selection = select_trades(engine, lineup, trades)
+    assert sorted(selection['chosen']) == [0, 1]
+    assert selection['chosen'] == [1, 0]
+
+def test_invalidate_resets_evaluator_cache_stats(league):
+    player = league['free_agents'][0]
+    cached_score(player)
+    cached_score(player)
+    assert evaluator_cache.stats['hits'] > 0
+
+    # Every league of a serial batch counts only its own hits and misses, as a league in its own process does
+    invalidate()
+    assert evaluator_cache.stats == {'hits': 0, 'misses': 0}
+
+def test_top_trades_keeps_a_stable_top_k():
+    rng = random.Random(0)
+    trades = [{'my_delta': rng.randint(0, 20), 'order': i} for i in range(200)]
+    expected = sorted(trades, key=lambda trade: -trade['my_delta'])
+
+    for k in (0, 1, 25, 500):
+        top_trades = TopTrades(k)
+        top_trades.extend(trades)
+        assert top_trades.best() == expected[:k]
+        assert len(top_trades) == min(k, len(trades)) and top_trades.seen == len(trades)
+
+def test_evaluate_matches_the_trade_search(league):
+    engine, teams = league['engine'], league['teams']
+    state = LeagueState()
+    trade = next(generate_mutual_trades(engine, engine.roster_indices(teams[0]['roster']), engine.roster_indices(teams[1]['roster']),
+                                        3, roster_size, bench_weight=config.opponent_bench_weight))
+
+    give, receive = [engine.players[j].id for j in trade['to_giveaway']], [engine.players[j].id for j in trade['to_receive']]
+    result = state.evaluate_trade(teams[1]['team_name'], give, receive)
+    assert result['mutual']
+    assert result['my_delta'] == pytest.approx(trade['my_delta'])
+    assert result['their_delta'] == pytest.approx(trade['their_delta'])
+
+    for team, bad_give, bad_receive in [
+        (teams[0]['team_name'], give, receive), # Trading with myself
+        (teams[1]['team_name'], [], receive),
+        (teams[1]['team_name'], give, ['Nobody']),
+        (teams[1]['team_name'], give + give[:1], receive),
+    ]:
+        with pytest.raises(ValueError):
+            state.evaluate_trade(team, bad_give, bad_receive)
+
+def test_server_replies_to_bad_requests(league):
+    state = LeagueState()
+    server = HTTPServer(('127.0.0.1', 0), RequestHandler)
+    server.routes = {('POST', '/evaluate'): state.evaluate_trade}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def post(body):
+        try:
+            with urlopen(f'http://127.0.0.1:{server.server_port}/evaluate', data=body) as response:
+                return response.status, json.load(response)
+        except HTTPError as error:
+            return error.code, json.load(error)
+
+    try:
+        assert post(b'{"team": ')[0] == 400
+        assert post(json.dumps({'team': league['teams'][1]['team_name'], 'give': [], 'receive': []}).encode())[0] == 400
+        assert post(json.dumps({'team': league['teams'][1]['team_name'], 'offer': []}).encode())[0] == 400
+    finally:
+        server.shutdown()
+        server.server_close()